@@ -0,0 +1,63 @@
+"""
+Time loading a large generated config: parsing it with the pure-Python and C YAML loaders, and loading it
+from the cache when the file hasn't changed.
+
+    python benchmarks/bench_config.py [applications]
+"""
+import os
+import random
+import sys
+import tempfile
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate(applications, seed=0):
+	"""
+	A config with `applications` rules over a tenth as many desktops, a quarter of them regexes
+	"""
+	rng = random.Random(seed)
+	lines = ['home:', '  name: ""', 'misc: "•"', 'desktops:']
+	per_desktop = 10
+	for i in range(max(1, applications // per_desktop)):
+		lines += [f'  - name: "desktop {i}"', f'    extra_name: "extra {i}"', f'    order: {i}', '    applications:']
+		for j in range(per_desktop):
+			if rng.random() < 0.25:
+				lines.append(f'      - class: "^(App{i}_{j}|Other{i}_{j})[0-9]*$"')
+			else:
+				lines += [f'      - class: "App{i}_{j}"', f'        instance: "app{i}_{j}"']
+	return "\n".join(lines) + "\n"
+
+
+def main(applications=500, repeat=20):
+	import yaml
+
+	from dynbsp.config import Config, ConfigSnapshot
+
+	content = generate(applications)
+	with open(Config.CONFIG_LOCATION, "w") as f:
+		f.write(content)
+
+	def uncached(loader):
+		return lambda: ConfigSnapshot(yaml.load(content, Loader=loader))
+
+	config = Config()
+	config.load()
+	results = {"safe_load (pure Python)": uncached(yaml.SafeLoader)}
+	if hasattr(yaml, "CSafeLoader"):
+		results["CSafeLoader"] = uncached(yaml.CSafeLoader)
+	results["cached"] = config.load
+
+	print(f"{applications} applications, {len(content) // 1024} KiB of YAML")
+	for name, load in results.items():
+		print(f"{name:<26}{timeit(load, number=repeat) / repeat * 1000:>9.2f} ms")
+
+
+if __name__ == '__main__':
+	home = tempfile.mkdtemp()
+	os.makedirs(os.path.join(home, ".config", "dynbsp"))
+	# The config and cache locations are read when dynbsp is imported
+	os.environ["HOME"] = home
+	os.environ.pop("XDG_CACHE_HOME", None)
+	main(*map(int, sys.argv[1:]))
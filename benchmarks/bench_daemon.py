@@ -0,0 +1,187 @@
+"""
+Time the daemon's hot paths against the bspwm simulator, and count the bspc messages each one sends.
+
+    python benchmarks/bench_daemon.py [windows ...] [--repeat N]
+
+Every run starts from a fresh simulated session, so the numbers don't depend on an X server
+or on what the previous run left behind.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from statistics import median
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import BspwmSimulator
+
+CONFIG = """
+home:
+  name: ""
+misc: "•"
+desktops:
+  - name: web
+    order: 220
+    applications:
+      - class: Chromium
+  - name: code
+    extra_name: pycharm
+    order: 320
+    applications:
+      - class: jetbrains-pycharm
+  - name: code
+    extra_name: idea
+    order: 330
+    applications:
+      - class: jetbrains-idea
+"""
+
+APPLICATIONS = {"web": ["Chromium"], "code pycharm": ["jetbrains-pycharm"], "code idea": ["jetbrains-idea"]}
+MISC_CLASSES = ["Alacritty", "mpv", "Gimp", "Thunar"]
+MISC = "•"
+
+
+def populate(simulator, windows, empty=0, seed=0):
+	"""
+	A session with `windows` windows: the configured desktops plus one misc desktop per ten windows,
+	created out of order, and `empty` extra desktops with nothing on them
+	"""
+	rng = random.Random(seed)
+	simulator.has_primary = True
+	simulator.reset(("eDP1",))
+	simulator.monitors[0]["desktops"][0]["name"] = ""
+	names = list(APPLICATIONS) + [MISC] * max(1, windows // 10 - len(APPLICATIONS)) + [MISC] * empty
+	rng.shuffle(names)
+	desktops = [simulator.add_desktop(name) for name in names]
+	occupied = [desktop for desktop in desktops if desktop["name"] != MISC] + \
+			   [desktop for desktop in desktops if desktop["name"] == MISC][:len(names) - len(APPLICATIONS) - empty]
+	for i in range(windows):
+		desktop = occupied[i % len(occupied)]
+		simulator.add_window(rng.choice(APPLICATIONS.get(desktop["name"], MISC_CLASSES)), desktop=desktop)
+
+
+def bench_node_added(simulator, windows):
+	populate(simulator, windows)
+	node_id = simulator.add_window("Chromium", desktop=simulator.monitors[0]["desktops"][0])
+	wm = get_wm()
+	node = wm.get_node(node_id)
+	return lambda: (node_added(wm, node.monitor, node.desktop, node), sub.run_deferred())
+
+
+def bench_reconcile(simulator, windows):
+	"""
+	Desktops out of order
+	"""
+	populate(simulator, windows)
+	wm = get_wm()
+	return lambda: reconcile(wm)
+
+
+def bench_reconcile_empty(simulator, windows):
+	"""
+	Desktops out of order, and one in forty desktops left empty
+	"""
+	populate(simulator, windows, empty=max(1, windows // 40))
+	wm = get_wm()
+	return lambda: reconcile(wm)
+
+
+def bench_reconcile_settled(simulator, windows):
+	"""
+	Nothing to do: the desktops already match the config
+	"""
+	populate(simulator, windows)
+	reconcile()
+	wm = get_wm()
+	return lambda: reconcile(wm)
+
+
+def bench_new_monitor_added(simulator, windows):
+	"""
+	Docking: every desktop moves to the monitor just plugged in, even though the laptop's is the primary output
+	"""
+	populate(simulator, windows)
+	monitor_id = simulator.hotplug("HDMI1")["id"]
+	wm = get_wm()
+	return lambda: new_monitor_added(wm.get_monitor(monitor_id), wm)
+
+
+def bench_remove_old_monitors(simulator, windows):
+	"""
+	Undocking: the external monitor is left unwired, holding every desktop plus a home desktop with windows on it
+	"""
+	populate(simulator, windows)
+	laptop = simulator.monitors[0]
+	external = simulator.plug("HDMI1")
+	external["desktops"][0]["name"] = ""
+	simulator.add_window("Alacritty", desktop=external["desktops"][0])
+	external["desktops"].extend(laptop["desktops"][1:])
+	del laptop["desktops"][1:]
+	simulator.unplug("HDMI1", remove=False)
+	wm = get_wm()
+	return lambda: remove_old_monitors(wm)
+
+
+BENCHMARKS = {
+	"node_added": bench_node_added,
+	"reconcile": bench_reconcile,
+	"reconcile (empty)": bench_reconcile_empty,
+	"reconcile (settled)": bench_reconcile_settled,
+	"new_monitor_added": bench_new_monitor_added,
+	"remove_old_monitors": bench_remove_old_monitors,
+}
+
+
+def run(simulator, setup, windows, repeat):
+	timings = []
+	commands = Counter()
+	for _ in range(repeat):
+		call = setup(simulator, windows)
+		simulator.commands.clear()
+		start = perf_counter()
+		call()
+		timings.append(perf_counter() - start)
+		commands = simulator.commands.copy()
+	return median(timings), commands
+
+
+def main(simulator):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("windows", nargs="*", type=int, default=[10, 100, 1000])
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+
+	print(f"{'benchmark':<22}{'windows':>8}{'ms':>10}{'messages':>10}  by domain")
+	for name, setup in BENCHMARKS.items():
+		for windows in args.windows:
+			seconds, commands = run(simulator, setup, windows, args.repeat)
+			domains = ", ".join(f"{domain} {n}" for domain, n in sorted(commands.items())) or "-"
+			print(f"{name:<22}{windows:>8}{seconds * 1000:>10.2f}{sum(commands.values()):>10}  {domains}")
+
+
+if __name__ == '__main__':
+	home = tempfile.mkdtemp()
+	os.makedirs(os.path.join(home, ".config", "dynbsp"))
+	with open(os.path.join(home, ".config", "dynbsp", "config.yaml"), "w") as f:
+		f.write(CONFIG)
+	# The config location is read when dynbsp is imported, so it points at a scratch home
+	os.environ["HOME"] = home
+	os.chdir(home)
+	session = BspwmSimulator()
+	os.environ["BSPWM_SOCKET"] = session.path
+
+	from dynbsp.dynbsp import node_added, sub
+	from dynbsp.helpers import new_monitor_added, remove_old_monitors
+	from dynbsp.reconciler import reconcile
+	from dynbsp.pybspc import get_wm
+
+	logging.getLogger().setLevel(logging.WARNING)
+	try:
+		main(session)
+	finally:
+		session.close()
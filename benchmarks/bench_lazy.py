@@ -0,0 +1,90 @@
+"""
+Measure what building the object graph costs when a handler only uses part of it,
+against wrapping every node up front.
+
+    python benchmarks/bench_lazy.py [nodes] [desktops]
+"""
+import os
+import sys
+import tracemalloc
+from copy import deepcopy
+from itertools import count
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynbsp.pybspc import BSPWM
+from dynbsp.pybspc.events import parse_event
+
+
+def make_tree(ids, leaves):
+	rectangle = {"x": 0, "y": 0, "width": 1920, "height": 1080}
+	node = {"id": next(ids), "sticky": False, "rectangle": rectangle, "firstChild": None, "secondChild": None,
+			"client": None}
+	if leaves == 1:
+		node["client"] = {"className": f"Class{node['id'] % 7}", "instanceName": "instance", "state": "tiled",
+						  "tiledRectangle": rectangle, "floatingRectangle": rectangle}
+	else:
+		node["firstChild"] = make_tree(ids, leaves // 2)
+		node["secondChild"] = make_tree(ids, leaves - leaves // 2)
+	return node
+
+
+def make_state(nodes, desktops):
+	ids = count(1)
+	monitor = {"id": next(ids), "name": "bench", "focusedDesktopId": 0, "desktops": [],
+			   "rectangle": {"x": 0, "y": 0, "width": 1920, "height": 1080},
+			   "padding": {"top": 0, "right": 0, "bottom": 0, "left": 0}}
+	for i in range(desktops):
+		desktop_id = next(ids)
+		root = make_tree(ids, max(1, (nodes // desktops + 1) // 2))
+		monitor["desktops"].append({"id": desktop_id, "name": f"desktop {i}", "focusedNodeId": root["id"],
+									"layout": "tiled", "root": root})
+	monitor["focusedDesktopId"] = monitor["desktops"][0]["id"]
+	return {"focusedMonitorId": monitor["id"], "monitors": [monitor]}
+
+
+def node_added(wm, event):
+	# What a node_add handler typically touches: the new node and the windows on its desktop
+	_, monitor, desktop, node = event.arguments(wm)
+	return node.client.class_name, [window.client.class_name for window in desktop.windows], monitor.rectangle
+
+
+def wrap_everything(wm, event):
+	# Every node and client wrapped up front, as BSPWM used to on construction
+	for node in wm.nodes:
+		node.client
+	return node_added(wm, event)
+
+
+def measure(data, event, use):
+	data = deepcopy(data)
+	tracemalloc.start()
+	use(BSPWM(data), event)
+	allocated, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return allocated
+
+
+def main(nodes=500, desktops=10, repeat=200):
+	data = make_state(nodes, desktops)
+	total = sum(len(BSPWM(data).get_desktop(d["id"]).node_data) for d in data["monitors"][0]["desktops"])
+	last = data["monitors"][0]["desktops"][-1]
+	leaf = last["root"]
+	while leaf["firstChild"] is not None:
+		leaf = leaf["secondChild"]
+	event = parse_event(f"node_add {data['monitors'][0]['id']} {last['id']} 0 {leaf['id']}")
+
+	lazy, eager = node_added(BSPWM(data), event), wrap_everything(BSPWM(data), event)
+	assert lazy == eager, "lazy and eager graphs disagree"
+
+	print(f"{total} nodes on {desktops} desktops, handling one node_add, {repeat} runs each")
+	print(f"{'graph':<10}{'KiB allocated':>15}{'us/event':>10}")
+	for name, use in (("eager", wrap_everything), ("lazy", node_added)):
+		allocated = measure(data, event, use)
+		seconds = timeit(lambda: use(BSPWM(data), event), number=repeat)
+		print(f"{name:<10}{allocated / 1024:>15.1f}{seconds / repeat * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
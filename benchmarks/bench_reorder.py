@@ -0,0 +1,54 @@
+"""
+Compare the swaps `Monitor.reorder` plans against the old one-swap-per-position approach.
+
+    python benchmarks/bench_reorder.py [desktops]
+"""
+import os
+import random
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dynbsp.pybspc import Monitor
+
+
+def make_monitor(desktops):
+	return Monitor({
+		"id": 1, "name": "bench", "focusedDesktopId": 2,
+		"desktops": [{"id": 2 + i, "name": f"desktop {i}", "focusedNodeId": 0, "root": None} for i in range(desktops)],
+	})
+
+
+def legacy_plan(monitor, ordered_desktops):
+	operations = []
+	working = monitor.desktops.copy()
+	for i in range(len(working)):
+		current_desktop = working[i]
+		target_index = ordered_desktops.index(current_desktop)
+		target_desktop = working[target_index]
+		operations.append((current_desktop, target_desktop))
+		working[i] = target_desktop
+		working[target_index] = current_desktop
+	return operations
+
+
+def main(desktops=60, repeat=200):
+	monitor = make_monitor(desktops)
+	shuffled = monitor.desktops.copy()
+	random.Random(0).shuffle(shuffled)
+	one_moved = monitor.desktops[1:] + monitor.desktops[:1]
+
+	print(f"{desktops} desktops, {repeat} runs each")
+	print(f"{'order':<12}{'planner':<10}{'swaps':>8}{'commands':>10}{'us/plan':>10}")
+	for label, ordered in (("unchanged", monitor.desktops), ("rotated", one_moved), ("shuffled", shuffled)):
+		for name, planner in (("legacy", legacy_plan), ("cycles", Monitor.plan_reorder)):
+			swaps = len(planner(monitor, ordered))
+			# With --reorder-desktops, any non-empty plan is sent as a single command
+			commands = swaps if planner is legacy_plan else min(swaps, 1)
+			seconds = timeit(lambda: planner(monitor, ordered), number=repeat)
+			print(f"{label:<12}{name:<10}{swaps:>8}{commands:>10}{seconds / repeat * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
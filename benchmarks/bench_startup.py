@@ -0,0 +1,113 @@
+"""
+Time how long the one-shot commands keybindings run take to start, against a stand-in daemon.
+
+    python benchmarks/bench_startup.py [--repeat N] [--budget RATIO]
+
+For each command this reports the wall time of the whole process and the time `python -X importtime` puts on
+the imports it makes beyond a bare interpreter's. The imports of the one-shot commands may take at most
+`--budget` times as long as a bare interpreter takes to start, so the budget holds on slow and fast machines
+alike; the script exits with a failure if any goes over it. `--help`, which loads the whole CLI,
+and importing the daemon module are shown for comparison.
+"""
+import argparse
+import os
+import select
+import subprocess
+import sys
+import tempfile
+import threading
+from statistics import median
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dynbsp.control import ControlServer
+
+# What the `dynbsp` console script runs; `python -m dynbsp` would add runpy's imports on top
+ENTRY_POINT = ["-c", "from dynbsp.__main__ import main; main()"]
+ONE_SHOT = [["pip"], ["new-desktop", "--move"], ["multimonitor"]]
+OTHERS = {"--help": [*ENTRY_POINT, "--help"], "import dynbsp.dynbsp": ["-c", "import dynbsp.dynbsp"]}
+
+
+def stand_in(path):
+	"""
+	A control server that accepts the one-shot commands and does nothing with them
+	"""
+	server = ControlServer(path)
+	for command in ("pip", "new-desktop", "multimonitor"):
+		server.register(command)(lambda **args: None)
+	server.listen()
+
+	def serve():
+		while server.socket is not None:
+			if select.select([server], [], [], 0.1)[0]:
+				server.accept()
+
+	threading.Thread(target=serve, daemon=True).start()
+	return server
+
+
+def imports(output):
+	"""
+	The modules imported at the top level, by cumulative microseconds
+	"""
+	modules = {}
+	for line in output.splitlines():
+		if not line.startswith("import time:"):
+			continue
+		_, cumulative, name = line[len("import time:"):].split("|")
+		if not name.startswith("  ") and cumulative.strip().isdigit():
+			modules[name.strip()] = int(cumulative)
+	return modules
+
+
+def measure(args, env, baseline, repeat):
+	walls, import_times = [], []
+	for _ in range(repeat):
+		start = perf_counter()
+		subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL)
+		walls.append(perf_counter() - start)
+		output = subprocess.run([sys.executable, "-X", "importtime", *args], env=env, check=True,
+								stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+		import_times.append(sum(us for name, us in imports(output).items() if name not in baseline))
+	return median(walls) * 1000, median(import_times) / 1000
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument("--repeat", type=int, default=10)
+	parser.add_argument("--budget", type=float, default=2.0,
+						help="how many bare interpreter startups a one-shot command's imports may take")
+	args = parser.parse_args()
+
+	runtime = tempfile.mkdtemp()
+	env = dict(os.environ, XDG_RUNTIME_DIR=runtime, HOME=runtime, PYTHONPATH=ROOT)
+	server = stand_in(os.path.join(runtime, "dynbsp.sock"))
+	baseline = imports(subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], env=env,
+									  stderr=subprocess.PIPE, text=True).stderr)
+	interpreter, _ = measure(["-c", "pass"], env, baseline, args.repeat)
+	budget = args.budget * interpreter
+
+	over = []
+	print(f"{'command':<28}{'wall ms':>10}{'imports ms':>12}")
+	print(f"{'(bare interpreter)':<28}{interpreter:>10.1f}{'-':>12}")
+	for command in ONE_SHOT:
+		wall, imported = measure([*ENTRY_POINT, *command], env, baseline, args.repeat)
+		label = " ".join(command)
+		print(f"{label:<28}{wall:>10.1f}{imported:>12.1f}")
+		if imported > budget:
+			over.append(label)
+	for label, command in OTHERS.items():
+		wall, imported = measure(command, env, baseline, args.repeat)
+		print(f"{label:<28}{wall:>10.1f}{imported:>12.1f}")
+	server.close()
+
+	if over:
+		print(f"Over the {budget:.1f} ms import budget: {', '.join(over)}")
+		raise SystemExit(1)
+	print(f"All one-shot commands are within the {budget:.1f} ms import budget")
+
+
+if __name__ == '__main__':
+	main()
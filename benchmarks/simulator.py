@@ -0,0 +1,610 @@
+"""
+A headless stand-in for bspwm: it serves the socket protocol (commands, queries and subscriptions)
+from a synthetic monitor/desktop/node tree, and can generate the event streams of a real session.
+
+	simulator = BspwmSimulator(monitors=("eDP1",))
+	os.environ["BSPWM_SOCKET"] = simulator.path
+	simulator.window_storm(100, ["Chromium", "Alacritty"])
+	simulator.commands  # Counter of the bspc domains it was sent
+
+Only what dynbsp uses is implemented: `wm -d`, `query`, and the `monitor`, `desktop` and `node`
+commands dynbsp sends, with the selectors and modifiers those need. Like bspwm, it reads at most
+`MESSAGE_SIZE` bytes of a message, and reports a failed command with the failure byte alone unless
+bspwm would explain it.
+"""
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+from collections import Counter
+from itertools import count
+
+# bspwm reads a message with a single recv into a BUFSIZ buffer, keeping the last byte for a terminator
+MESSAGE_SIZE = 8192 - 1
+
+
+def _hex(i):
+	return f"0x{i:08X}"
+
+
+class BspwmSimulator:
+	def __init__(self, monitors=("eDP1",), path=None):
+		self.lock = threading.RLock()
+		self.subscribers = []
+		self.commands = Counter()
+		# Whether `monitor --reorder-desktops` is understood, as it isn't by older bspwm versions
+		self.reorder_desktops = True
+		# Whether RandR reports the first monitor as the primary output
+		self.has_primary = True
+		self.reset(monitors)
+		self.path = path or os.path.join(tempfile.mkdtemp(), "bspwm-socket")
+		self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.server.bind(self.path)
+		self.server.listen(64)
+		self.thread = threading.Thread(target=self.serve, daemon=True)
+		self.thread.start()
+
+	def reset(self, monitors=("eDP1",)):
+		"""
+		Start again from monitors holding a single empty desktop each. Subscriptions are kept
+		"""
+		with self.lock:
+			self.ids = count(0x00200001)
+			self.monitors = []
+			self.focused_monitor = None
+			for i, name in enumerate(monitors):
+				self.add_monitor(name, f"1920x1080+{1920 * i}+0", emit=False)
+			self.commands.clear()
+
+	# ---------------------------------------------------------------- model
+	def _new_id(self):
+		return next(self.ids)
+
+	def add_monitor(self, name, geometry="1920x1080+0+0", emit=True):
+		w, rest = geometry.split("x")
+		h, x, y = rest.split("+")
+		monitor = {
+			"name": name, "id": self._new_id(), "randrId": 0, "wired": True, "stickyHeight": 0, "windowGap": 6,
+			"borderWidth": 1, "focusedDesktopId": 0,
+			"padding": {"top": 0, "right": 0, "bottom": 0, "left": 0},
+			"rectangle": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}, "desktops": [],
+		}
+		self.monitors.append(monitor)
+		if self.focused_monitor is None:
+			self.focused_monitor = monitor
+		self._add_desktop(monitor, "Desktop", emit=False)
+		if emit:
+			self.emit("monitor_add", _hex(monitor["id"]), name, geometry)
+		return monitor
+
+	def _add_desktop(self, monitor, name, emit=True):
+		desktop = {
+			"name": name, "id": self._new_id(), "layout": "tiled", "userLayout": "tiled", "windowGap": 6,
+			"borderWidth": 1, "focusedNodeId": 0,
+			"padding": {"top": 0, "right": 0, "bottom": 0, "left": 0}, "root": None,
+		}
+		monitor["desktops"].append(desktop)
+		if not monitor["focusedDesktopId"]:
+			monitor["focusedDesktopId"] = desktop["id"]
+		if emit:
+			self.emit("desktop_add", _hex(monitor["id"]), _hex(desktop["id"]), name)
+		return desktop
+
+	def _node(self, client=None):
+		return {
+			"id": self._new_id(), "splitType": "vertical", "splitRatio": 0.5, "vacant": False, "hidden": False,
+			"sticky": False, "private": False, "locked": False, "marked": False, "presel": None,
+			"rectangle": {"x": 0, "y": 0, "width": 100, "height": 100},
+			"constraints": {"min_width": 32, "min_height": 32},
+			"firstChild": None, "secondChild": None, "client": client,
+		}
+
+	@staticmethod
+	def _client(class_name, instance_name):
+		rect = {"x": 0, "y": 0, "width": 800, "height": 600}
+		return {
+			"className": class_name, "instanceName": instance_name, "borderWidth": 1, "state": "tiled",
+			"lastState": "tiled", "layer": "normal", "lastLayer": "normal", "urgent": False, "shown": True,
+			"tiledRectangle": dict(rect), "floatingRectangle": dict(rect),
+		}
+
+	def dump(self):
+		return {
+			"focusedMonitorId": self.focused_monitor["id"] if self.focused_monitor else 0,
+			"primaryMonitorId": self.monitors[0]["id"] if self.monitors and self.has_primary else 0,
+			"clientsCount": sum(1 for _ in self.all_nodes() if _[2]["client"]),
+			"monitors": self.monitors, "focusHistory": [], "stackingList": [],
+		}
+
+	def all_desktops(self):
+		for monitor in self.monitors:
+			for desktop in monitor["desktops"]:
+				yield monitor, desktop
+
+	@staticmethod
+	def walk(node):
+		stack = [node] if node else []
+		while stack:
+			n = stack.pop()
+			yield n
+			for child in (n["secondChild"], n["firstChild"]):
+				if child:
+					stack.append(child)
+
+	def all_nodes(self):
+		for monitor, desktop in self.all_desktops():
+			for node in self.walk(desktop["root"]):
+				yield monitor, desktop, node
+
+	def focused_desktop(self, monitor=None):
+		monitor = monitor or self.focused_monitor
+		return next(d for d in monitor["desktops"] if d["id"] == monitor["focusedDesktopId"])
+
+	def monitor_of(self, desktop):
+		return next(m for m, d in self.all_desktops() if d is desktop)
+
+	def _insert(self, desktop, leaf):
+		if desktop["root"] is None:
+			desktop["root"] = leaf
+			return 0
+		ip_id = desktop["focusedNodeId"]
+		ip = next((n for n in self.walk(desktop["root"]) if n["id"] == ip_id and n["client"]), None)
+		if ip is None:
+			ip = next(n for n in self.walk(desktop["root"]) if n["client"])
+		parent = self._parent(desktop, ip)
+		internal = self._node()
+		internal["firstChild"], internal["secondChild"] = ip, leaf
+		if parent is None:
+			desktop["root"] = internal
+		elif parent["firstChild"] is ip:
+			parent["firstChild"] = internal
+		else:
+			parent["secondChild"] = internal
+		return ip["id"]
+
+	def _parent(self, desktop, target):
+		for n in self.walk(desktop["root"]):
+			if n["firstChild"] is target or n["secondChild"] is target:
+				return n
+		return None
+
+	def _detach(self, desktop, node):
+		parent = self._parent(desktop, node)
+		if parent is None:
+			desktop["root"] = None
+		else:
+			sibling = parent["secondChild"] if parent["firstChild"] is node else parent["firstChild"]
+			grand = self._parent(desktop, parent)
+			if grand is None:
+				desktop["root"] = sibling
+			elif grand["firstChild"] is parent:
+				grand["firstChild"] = sibling
+			else:
+				grand["secondChild"] = sibling
+		if desktop["focusedNodeId"] in {n["id"] for n in self.walk(node)}:
+			leaf = next((n for n in self.walk(desktop["root"]) if n["client"]), None)
+			desktop["focusedNodeId"] = leaf["id"] if leaf else 0
+
+	def add_window(self, class_name, instance_name=None, desktop=None):
+		with self.lock:
+			desktop = desktop or self.focused_desktop()
+			monitor = self.monitor_of(desktop)
+			leaf = self._node(self._client(class_name, instance_name or class_name.lower()))
+			ip = self._insert(desktop, leaf)
+			desktop["focusedNodeId"] = leaf["id"]
+			self.emit("node_add", _hex(monitor["id"]), _hex(desktop["id"]), _hex(ip), _hex(leaf["id"]))
+			return leaf["id"]
+
+	def close_window(self, node_id):
+		with self.lock:
+			for monitor, desktop, node in list(self.all_nodes()):
+				if node["id"] == node_id:
+					self._detach(desktop, node)
+					self.emit("node_remove", _hex(monitor["id"]), _hex(desktop["id"]), _hex(node_id))
+					return
+
+	def add_desktop(self, name, monitor=None):
+		with self.lock:
+			return self._add_desktop(monitor or self.focused_monitor, name)
+
+	def unplug(self, name, remove=True):
+		"""
+		Disconnect an output. Without `remove`, the monitor is kept but no longer wired, as bspwm does
+		unless `remove_unplugged_monitors` is set
+		"""
+		with self.lock:
+			monitor = next(m for m in self.monitors if m["name"] == name)
+			if not remove:
+				monitor["wired"] = False
+				return
+			self.monitors.remove(monitor)
+			if self.focused_monitor is monitor:
+				self.focused_monitor = self.monitors[0] if self.monitors else None
+			self.emit("monitor_remove", _hex(monitor["id"]))
+
+	def plug(self, name, geometry="1920x1080+1920+0"):
+		with self.lock:
+			return self.add_monitor(name, geometry)
+
+	# ---------------------------------------------------------------- event streams
+	def window_storm(self, windows, classes, desktops=None, seed=0):
+		"""
+		Open `windows` windows as fast as possible, with classes picked from `classes`,
+		spread over `desktops` (the focused desktop by default)
+		"""
+		rng = random.Random(seed)
+		desktops = desktops or [self.focused_desktop()]
+		return [self.add_window(rng.choice(classes), desktop=desktops[i % len(desktops)]) for i in range(windows)]
+
+	def mass_close(self, windows=None, seed=0):
+		"""
+		Close `windows` random windows, or all of them
+		"""
+		with self.lock:
+			ids = [node["id"] for _, _, node in self.all_nodes() if node["client"] is not None]
+		if windows is not None:
+			ids = random.Random(seed).sample(ids, min(windows, len(ids)))
+		for node_id in ids:
+			self.close_window(node_id)
+		return ids
+
+	def hotplug(self, name, geometry="1920x1080+1920+0"):
+		"""
+		Plug a monitor in, or unplug it if it's already there
+		"""
+		if any(monitor["name"] == name for monitor in self.monitors):
+			self.unplug(name)
+			return None
+		return self.plug(name, geometry)
+
+	def focus_storm(self, events, seed=0):
+		"""
+		Report focus and pointer events the way moving the mouse across windows does
+		"""
+		rng = random.Random(seed)
+		with self.lock:
+			windows = [(monitor, desktop, node) for monitor, desktop, node in self.all_nodes() if node["client"]]
+		for _ in range(events):
+			monitor, desktop, node = rng.choice(windows)
+			ids = _hex(monitor["id"]), _hex(desktop["id"]), _hex(node["id"])
+			self.emit("pointer_action", *ids, "move", "begin")
+			self.emit("node_geometry", *ids, "800x600+0+0")
+			self.emit("node_focus", *ids)
+
+	# ---------------------------------------------------------------- events
+	def emit(self, *event):
+		line = (" ".join(event) + "\n").encode()
+		for sock, events in list(self.subscribers):
+			if "all" in events or event[0] in events:
+				try:
+					sock.sendall(line)
+				except OSError:
+					self.subscribers.remove((sock, events))
+
+	# ---------------------------------------------------------------- selectors
+	@staticmethod
+	def _split(selector):
+		descriptor, *modifiers = selector.split(".")
+		return descriptor, modifiers
+
+	def _parse_id(self, s):
+		try:
+			return int(s, 0)
+		except ValueError:
+			return None
+
+	def find_monitors(self, selector):
+		descriptor, modifiers = self._split(selector)
+		if descriptor == "focused":
+			candidates = [self.focused_monitor]
+		elif descriptor == "primary":
+			candidates = self.monitors[:1]
+		elif descriptor == "":
+			candidates = list(self.monitors)
+		else:
+			i = self._parse_id(descriptor)
+			candidates = [m for m in self.monitors if m["id"] == i or m["name"] == descriptor]
+		return [m for m in candidates if m]
+
+	def find_desktops(self, selector):
+		descriptor, modifiers = self._split(selector)
+		if descriptor == "focused":
+			candidates = [self.focused_desktop()]
+		elif descriptor == "":
+			candidates = [d for _, d in self.all_desktops()]
+		elif descriptor.startswith("^"):
+			candidates = [d for _, d in self.all_desktops()][int(descriptor[1:]) - 1:int(descriptor[1:])]
+		else:
+			i = self._parse_id(descriptor)
+			candidates = [d for _, d in self.all_desktops() if d["id"] == i or d["name"] == descriptor]
+		for modifier in modifiers:
+			if modifier in ("occupied", "!occupied"):
+				want = modifier == "occupied"
+				candidates = [d for d in candidates if (d["root"] is not None) == want]
+		return candidates
+
+	def find_nodes(self, selector):
+		if selector.startswith("@"):
+			desktop_sel, path = selector[1:].split(":", 1)
+			desktops = self.find_desktops(desktop_sel)
+			if path != "/" or not desktops or desktops[0]["root"] is None:
+				return []
+			return [(self.monitor_of(desktops[0]), desktops[0], desktops[0]["root"])]
+		descriptor, modifiers = self._split(selector)
+		if descriptor == "focused":
+			desktop = self.focused_desktop()
+			candidates = [(self.monitor_of(desktop), desktop, n) for n in self.walk(desktop["root"])
+						  if n["id"] == desktop["focusedNodeId"]]
+		elif descriptor == "":
+			candidates = list(self.all_nodes())
+		else:
+			i = self._parse_id(descriptor)
+			candidates = [t for t in self.all_nodes() if t[2]["id"] == i]
+		for modifier in modifiers:
+			negate = modifier.startswith("!")
+			key = modifier.lstrip("!")
+			if key == "window":
+				candidates = [t for t in candidates if (t[2]["client"] is not None) != negate]
+			elif key == "leaf":
+				candidates = [t for t in candidates if (t[2]["firstChild"] is None) != negate]
+			elif key in ("hidden", "sticky", "private", "locked", "marked"):
+				candidates = [t for t in candidates if bool(t[2][key]) != negate]
+			elif key in ("tiled", "floating", "fullscreen", "pseudo_tiled"):
+				candidates = [t for t in candidates if t[2]["client"] and (t[2]["client"]["state"] == key) != negate]
+		return candidates
+
+	# ---------------------------------------------------------------- protocol
+	def serve(self):
+		while True:
+			try:
+				client, _ = self.server.accept()
+			except OSError:
+				return
+			data = self.receive(client)
+			args = [a.decode() for a in data.split(b"\0")[:-1]]
+			if args and args[0] == "subscribe":
+				self.commands["subscribe"] += 1
+				self.subscribers.append((client, set(args[1:]) or {"report"}))
+				continue
+			with self.lock:
+				try:
+					out = self.handle(args)
+					reply = (out + "\n").encode() if out else b""
+				except Exception as e:
+					# An empty message stands for the many failures bspwm reports without one
+					reply = b"\x07" + (f"{e}\n".encode() if str(e) else b"")
+			try:
+				client.sendall(reply)
+			finally:
+				client.close()
+
+	@staticmethod
+	def receive(client, timeout=1.0):
+		"""
+		Read a message the way bspwm does: anything past `MESSAGE_SIZE` bytes is cut off, and the argument
+		left unterminated by the cut is dropped when the message is split up. pybspc shuts down its side of the
+		socket once it has sent a message; a client that doesn't gets what arrived before `timeout`
+		"""
+		client.settimeout(timeout)
+		data = b""
+		try:
+			while len(data) < MESSAGE_SIZE:
+				chunk = client.recv(MESSAGE_SIZE - len(data))
+				if not chunk:
+					break
+				data += chunk
+		except socket.timeout:
+			pass
+		client.settimeout(None)
+		return data
+
+	def handle(self, args):
+		self.commands[args[0]] += 1
+		method = getattr(self, f"cmd_{args[0]}")
+		return method(args[1:])
+
+	def cmd_wm(self, args):
+		if args[0] in ("-d", "--dump-state"):
+			return json.dumps(self.dump())
+		raise ValueError(f"Unknown wm command {args}")
+
+	def cmd_query(self, args):
+		kind, tree, selectors = None, False, {}
+		i = 0
+		while i < len(args):
+			a = args[i]
+			if a in ("-T", "--tree"):
+				tree = True
+			elif a in ("-M", "--monitors"):
+				kind = "m"
+			elif a in ("-D", "--desktops"):
+				kind = "d"
+			elif a in ("-N", "--nodes"):
+				kind = "n"
+			elif a in ("-m", "--monitor", "-d", "--desktop", "-n", "--node"):
+				sel = args[i + 1] if i + 1 < len(args) and not args[i + 1].startswith("-") else "focused"
+				selectors[a.lstrip("-")[0]] = sel
+				i += 1
+			elif a == "--names":
+				selectors["names"] = True
+			i += 1
+		if tree:
+			if "n" in selectors:
+				found = self.find_nodes(selectors["n"])
+				if not found:
+					raise ValueError("No node found")
+				return json.dumps(found[0][2])
+			if "d" in selectors:
+				found = self.find_desktops(selectors["d"])
+				if not found:
+					raise ValueError("No desktop found")
+				return json.dumps(found[0])
+			found = self.find_monitors(selectors.get("m", "focused"))
+			if not found:
+				raise ValueError("No monitor found")
+			return json.dumps(found[0])
+		names = selectors.get("names", False)
+		if kind == "m":
+			items = self.find_monitors(selectors.get("m", ""))
+		elif kind == "d":
+			items = self.find_desktops(selectors.get("d", ""))
+			if "m" in selectors:
+				allowed = {id(d) for m in self.find_monitors(selectors["m"]) for d in m["desktops"]}
+				items = [d for d in items if id(d) in allowed]
+		else:
+			items = [t[2] for t in self.find_nodes(selectors.get("n", ""))]
+			if "d" in selectors:
+				allowed = {n["id"] for d in self.find_desktops(selectors["d"]) for n in self.walk(d["root"])}
+				items = [n for n in items if n["id"] in allowed]
+		if not items:
+			raise ValueError("")
+		return "\n".join(item["name"] if names else _hex(item["id"]) for item in items)
+
+	def cmd_monitor(self, args):
+		monitors = self.find_monitors(args[0]) if args and not args[0].startswith("-") else [self.focused_monitor]
+		if not monitors:
+			raise ValueError("Invalid monitor selector")
+		monitor = monitors[0]
+		rest = args[1:] if args and not args[0].startswith("-") else args
+		i = 0
+		while i < len(rest):
+			a = rest[i]
+			if a in ("-a", "--add-desktops"):
+				i += 1
+				while i < len(rest) and not rest[i].startswith("-"):
+					self._add_desktop(monitor, rest[i])
+					i += 1
+				continue
+			elif a in ("-r", "--remove"):
+				self.monitors.remove(monitor)
+				if self.focused_monitor is monitor:
+					self.focused_monitor = self.monitors[0] if self.monitors else None
+				self.emit("monitor_remove", _hex(monitor["id"]))
+			elif a in ("-o", "--reorder-desktops"):
+				names = []
+				i += 1
+				while i < len(rest) and not rest[i].startswith("-"):
+					names.append(rest[i])
+					i += 1
+				if not self.reorder_desktops:
+					raise ValueError(f"monitor: Unknown command: '{a}'.")
+				desktops = monitor["desktops"]
+				for position, name in enumerate(names):
+					if position >= len(desktops):
+						break
+					# Like bspwm, look the name up everywhere and skip it if it's found on another monitor
+					d, d2 = desktops[position], next((x for _, x in self.all_desktops() if x["name"] == name), None)
+					if d2 is not None and d2 is not d and any(x is d2 for x in desktops):
+						j = desktops.index(d2)
+						desktops[position], desktops[j] = d2, d
+						self.emit("desktop_swap", _hex(monitor["id"]), _hex(d["id"]), _hex(monitor["id"]),
+								  _hex(d2["id"]))
+				continue
+			else:
+				raise ValueError(f"Unknown monitor command {a}")
+			i += 1
+		return ""
+
+	def cmd_desktop(self, args):
+		desktops = self.find_desktops(args[0])
+		if not desktops:
+			raise ValueError("Invalid descriptor found or desktop not found")
+		desktop = desktops[0]
+		rest = args[1:]
+		i = 0
+		while i < len(rest):
+			a = rest[i]
+			monitor = self.monitor_of(desktop)
+			if a in ("-n", "--rename"):
+				old = desktop["name"]
+				desktop["name"] = rest[i + 1]
+				self.emit("desktop_rename", _hex(monitor["id"]), _hex(desktop["id"]), old, desktop["name"])
+				i += 1
+			elif a in ("-r", "--remove"):
+				if len(monitor["desktops"]) == 1:
+					raise ValueError("")
+				monitor["desktops"].remove(desktop)
+				if monitor["focusedDesktopId"] == desktop["id"]:
+					monitor["focusedDesktopId"] = monitor["desktops"][0]["id"]
+				self.emit("desktop_remove", _hex(monitor["id"]), _hex(desktop["id"]))
+			elif a in ("-s", "--swap"):
+				other = self.find_desktops(rest[i + 1])[0]
+				other_monitor = self.monitor_of(other)
+				a_i, b_i = monitor["desktops"].index(desktop), other_monitor["desktops"].index(other)
+				monitor["desktops"][a_i], other_monitor["desktops"][b_i] = other, desktop
+				if monitor is not other_monitor:
+					for m, gone, came in ((monitor, desktop, other), (other_monitor, other, desktop)):
+						if m["focusedDesktopId"] == gone["id"]:
+							m["focusedDesktopId"] = came["id"]
+				self.emit("desktop_swap", _hex(monitor["id"]), _hex(desktop["id"]), _hex(other_monitor["id"]),
+						  _hex(other["id"]))
+				i += 1
+			elif a in ("-m", "--to-monitor"):
+				target = self.find_monitors(rest[i + 1])[0]
+				if len(monitor["desktops"]) == 1:
+					# bspwm won't leave a monitor without a desktop
+					raise ValueError("")
+				if target is not monitor:
+					monitor["desktops"].remove(desktop)
+					if monitor["focusedDesktopId"] == desktop["id"] and monitor["desktops"]:
+						monitor["focusedDesktopId"] = monitor["desktops"][0]["id"]
+					target["desktops"].append(desktop)
+					self.emit("desktop_transfer", _hex(monitor["id"]), _hex(desktop["id"]), _hex(target["id"]))
+				i += 1
+			elif a == "--follow":
+				pass
+			else:
+				raise ValueError(f"Unknown desktop command {a}")
+			i += 1
+		return ""
+
+	def cmd_node(self, args):
+		nodes = self.find_nodes(args[0])
+		if not nodes:
+			raise ValueError("Invalid descriptor found or node not found")
+		monitor, desktop, node = nodes[0]
+		rest = args[1:]
+		i = 0
+		while i < len(rest):
+			a = rest[i]
+			if a in ("-d", "--to-desktop"):
+				target = self.find_desktops(rest[i + 1])[0]
+				if target is not desktop:
+					self._detach(desktop, node)
+					ip = self._insert(target, node)
+					target_monitor = self.monitor_of(target)
+					self.emit("node_transfer", _hex(monitor["id"]), _hex(desktop["id"]), _hex(node["id"]),
+							  _hex(target_monitor["id"]), _hex(target["id"]), _hex(ip))
+					monitor, desktop = target_monitor, target
+				i += 1
+			elif a in ("-t", "--state"):
+				node["client"]["state"] = rest[i + 1]
+				self.emit("node_state", _hex(monitor["id"]), _hex(desktop["id"]), _hex(node["id"]), rest[i + 1], "on")
+				i += 1
+			elif a in ("-g", "--flag"):
+				flag, _, value = rest[i + 1].partition("=")
+				node[flag] = value != "off"
+				self.emit("node_flag", _hex(monitor["id"]), _hex(desktop["id"]), _hex(node["id"]), flag, value or "on")
+				i += 1
+			elif a in ("-v", "--move"):
+				rect = node["client"]["floatingRectangle"]
+				rect["x"] += int(rest[i + 1])
+				rect["y"] += int(rest[i + 2])
+				i += 2
+			elif a in ("-z", "--resize"):
+				rect = node["client"]["floatingRectangle"]
+				rect["width"] += int(rest[i + 2])
+				rect["height"] += int(rest[i + 3])
+				i += 3
+			elif a == "--follow":
+				pass
+			else:
+				raise ValueError(f"Unknown node command {a}")
+			i += 1
+		return ""
+
+	def close(self):
+		self.server.close()
+		os.unlink(self.path)
@@ -1,64 +1,33 @@
-import click
+"""
+The `dynbsp` command. Keybindings run it for one-shot commands that the running instance can serve,
+so those are sent straight to it without importing click, yaml or pybspc. Everything else, including
+those commands when no instance is running, goes through the click CLI in `cli.py`.
+"""
+import sys
 
-from .dynbsp import sub
-from .helpers import create_home, clear_empty_desktops, rename_all, update_names, reorder, remove_old_monitors, \
- new_misc_desktop, picture_in_picture
-from .pybspc import get_wm
-from .singleton import instance_already_running
+# Command line -> the control command and arguments the running instance serves it with
+ONE_SHOT = {
+	("pip",): ("pip", {}),
+	("new-desktop",): ("new-desktop", {"move": False}),
+	("new-desktop", "--move"): ("new-desktop", {"move": True}),
+	("multimonitor",): ("multimonitor", {}),
+}
 
 
-@click.group("dynbsp", invoke_without_command=True)
-@click.option('--profile', default=False, is_flag=True, help='profile application')
-@click.pass_context
-def cli(ctx, profile):
-	if profile:
-		import cProfile
-		import atexit
+def main(args=None):
+	args = sys.argv[1:] if args is None else args
+	one_shot = ONE_SHOT.get(tuple(args))
+	if one_shot is not None:
+		from .control import run_in_daemon
 
-		print("Profiling...")
-		pr = cProfile.Profile()
-		pr.enable()
+		command, arguments = one_shot
+		if run_in_daemon(command, **arguments):
+			return
 
-		def exit():
-			pr.disable()
-			pr.dump_stats("profile.cprofile")
-			print("Profiling completed")
+	from .cli import cli
 
-		atexit.register(exit)
-
-	if ctx.invoked_subcommand is None:
-		start()
-
-
-@cli.command()
-def start():
-	if instance_already_running():
-		print("dynbsp already running")
-		return
-	create_home()
-	clear_empty_desktops(get_wm())
-	rename_all()
-	update_names()
-	reorder()
-	sub.listen()
-	print("hi")
-
-
-@cli.command()
-def multimonitor():
-	remove_old_monitors()
-
-
-@cli.command()
-@click.option('--move', default=False, is_flag=True, help='move current node to desktop')
-def new_desktop(move):
-	new_misc_desktop(move)
-
-
-@cli.command()
-def pip():
-	picture_in_picture()
+	cli.main(args, prog_name="dynbsp")
 
 
 if __name__ == '__main__':
-	cli()
+	main()
@@ -0,0 +1,149 @@
+import json
+
+import click
+
+from .control import ControlError, request, run_in_daemon
+
+
+@click.group("dynbsp", invoke_without_command=True)
+@click.option('--profile', default=False, is_flag=True, help='profile application')
+@click.pass_context
+def cli(ctx, profile):
+	if profile:
+		import cProfile
+		import atexit
+
+		print("Profiling...")
+		pr = cProfile.Profile()
+		pr.enable()
+
+		def exit():
+			pr.disable()
+			pr.dump_stats("profile.cprofile")
+			print("Profiling completed")
+
+		atexit.register(exit)
+
+	if ctx.invoked_subcommand is None:
+		ctx.invoke(start)
+
+
+# Commands import what they need themselves, so the ones that only talk to the daemon stay fast to start
+
+
+@cli.command()
+@click.option('--debounce', default=0.05, show_default=True, type=float,
+			  help='seconds to wait for more events before renaming and reordering desktops')
+@click.option('--log-level', default='INFO', show_default=True, envvar='DYNBSP_LOG_LEVEL',
+			  type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR'], case_sensitive=False),
+			  help='least severe messages to write to the log file and stderr')
+def start(debounce=0.05, log_level='INFO'):
+	from .singleton import instance_already_running
+
+	if instance_already_running():
+		print("dynbsp already running")
+		return
+
+	from .dynbsp import sub, watch_config, serve_control, handle_signals, start_logging
+	from .reconciler import reconcile
+
+	start_logging(log_level.upper())
+	reconcile()
+	sub.debounce = debounce
+	watch_config()
+	serve_control()
+	handle_signals()
+	sub.listen()
+	print("hi")
+
+
+@cli.command()
+@click.option('--json', 'as_json', default=False, is_flag=True, help='print the raw JSON')
+def stats(as_json):
+	try:
+		data = request("stats")
+	except OSError:
+		print("dynbsp isn't running")
+		raise SystemExit(1)
+	if as_json:
+		print(json.dumps(data, indent=2))
+	else:
+		from .pybspc.metrics import format_stats
+
+		print(format_stats(data))
+
+
+@cli.command()
+@click.option('-n', '--lines', 'count', default=None, type=int, help='only show the most recent LINES')
+def logs(count):
+	try:
+		result = request("logs", count=count)
+	except OSError:
+		print("dynbsp isn't running")
+		raise SystemExit(1)
+	print("\n".join(result["lines"]))
+	if result["dropped"]:
+		print(f"({result['dropped']} messages were dropped because the log writer fell behind)")
+
+
+@cli.command()
+@click.argument('action', type=click.Choice(['start', 'stop', 'status']))
+def profile(action):
+	try:
+		result = request("profile", action=action)
+	except OSError:
+		print("dynbsp isn't running")
+		raise SystemExit(1)
+	if result["files"]:
+		print("\n".join(result["files"]))
+	else:
+		print("Profiling" if result["active"] else "Not profiling")
+
+
+@cli.command()
+@click.option('--dry-run', default=False, is_flag=True, help='only print what would be done')
+def reconcile(dry_run):
+	try:
+		lines = request("reconcile", dry_run=dry_run)
+	except ControlError as e:
+		print(f"dynbsp couldn't reconcile: {e}")
+		raise SystemExit(1)
+	except OSError:
+		from .reconciler import reconcile as reconcile_desktops
+
+		lines = reconcile_desktops(dry_run=dry_run)
+	if dry_run:
+		print("\n".join(lines) or "Nothing to do")
+
+
+@cli.command()
+@click.option('--dry-run', default=False, is_flag=True, help='only print what would be done')
+def multimonitor(dry_run):
+	try:
+		lines = request("multimonitor", dry_run=dry_run)
+	except ControlError as e:
+		print(f"dynbsp couldn't multimonitor: {e}")
+		raise SystemExit(1)
+	except OSError:
+		from .helpers import remove_old_monitors
+
+		lines = remove_old_monitors(dry_run=dry_run)
+	if dry_run:
+		print("\n".join(lines) or "Nothing to do")
+
+
+@cli.command()
+@click.option('--move', default=False, is_flag=True, help='move current node to desktop')
+def new_desktop(move):
+	if not run_in_daemon("new-desktop", move=move):
+		from .helpers import new_misc_desktop
+
+		new_misc_desktop(move)
+
+
+@cli.command()
+def pip():
+	if not run_in_daemon("pip"):
+		from .helpers import picture_in_picture
+
+		picture_in_picture()
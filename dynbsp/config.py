@@ -1,80 +1,214 @@
+import marshal
 import os
+from functools import lru_cache
+from hashlib import sha1
 from pathlib import Path
-from re import compile
+from logging import debug, error
+from re import compile, error as PatternError
 from shutil import copyfile
-from typing import Set
-
-from yaml import safe_load
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
 from .pybspc import Node, BSPWM, get_wm, Desktop, Monitor
 
 
+class ConfigSnapshot:
+	"""
+	One parsed version of the config file. It's never modified; a reload replaces it as a whole
+	"""
+
+	def __init__(self, data):
+		desktops = [DesktopConfig(desktop, i) for i, desktop in enumerate(data['desktops'])]
+		self.desktops: FrozenSet[DesktopConfig] = frozenset(desktops)
+		self.misc_name: str = data['misc']
+		self.home_desktop = DesktopConfig(data['home'])
+		# Both names a configured desktop can be shown under -> the configs that use them
+		self.names: Dict[str, List[DesktopConfig]] = {}
+		for desktop in desktops:
+			for name in dict.fromkeys((desktop.collapsed_name, desktop.expanded_name)):
+				self.names.setdefault(name, []).append(desktop)
+		# Rules are indexed in file order, so the first matching rule in the file wins
+		self.rules = RuleIndex([app for desktop in desktops for app in desktop.applications])
+
+
+def parse_yaml(content: bytes):
+	# Only the commands that actually parse the config pay for importing the YAML parser
+	import yaml
+
+	# The C loader is an order of magnitude faster, when PyYAML was built against libyaml
+	loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+	return yaml.load(content, Loader=loader)
+
+
+class CachedConfig:
+	def __init__(self, stat: Tuple[int, int], digest: str, data):
+		"""
+		:param stat: the mtime (in ns) and size of the config file the data was parsed from
+		:param digest: the SHA-1 of its contents
+		:param data: what parsing it returned
+		"""
+		self.stat = stat
+		self.digest = digest
+		self.data = data
+
+
+class ConfigCache:
+	"""
+	The parsed config file, marshalled so loading it skips the YAML parser. A cache that can't be read,
+	or was written by another version of the format, is ignored and replaced the next time the file is parsed
+	"""
+
+	VERSION = 1
+
+	def __init__(self, path: str):
+		self.path = path
+
+	def read(self) -> Optional[CachedConfig]:
+		try:
+			with open(self.path, 'rb') as f:
+				version, stat, digest, data = marshal.load(f)
+			if version != self.VERSION:
+				return None
+			return CachedConfig(tuple(stat), digest, data)
+		except FileNotFoundError:
+			return None
+		except (OSError, EOFError, ValueError, TypeError) as e:
+			debug(f"Ignoring the unreadable config cache {self.path}: {e!r}")
+			return None
+
+	def write(self, cached: CachedConfig):
+		temporary = f"{self.path}.{os.getpid()}"
+		try:
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			with open(temporary, 'wb') as f:
+				marshal.dump((self.VERSION, cached.stat, cached.digest, cached.data), f)
+			os.replace(temporary, self.path)
+		except (OSError, ValueError) as e:
+			# ValueError: the YAML held something marshal can't store, such as a date
+			debug(f"Couldn't cache the config in {self.path}: {e!r}")
+			if os.path.exists(temporary):
+				os.unlink(temporary)
+
+
 class Config:
-	_home_desktop: "DesktopConfig"
-	_misc_name: str
-	_desktops: Set["DesktopConfig"]
-	last_modified: float = None
 	DEFAULT_LOCATION = Path(os.path.realpath(__file__)).parent.joinpath('default_config.yaml')
 	CONFIG_LOCATION = os.path.join(os.getenv("HOME"), '.config/dynbsp/config.yaml')
+	STATE_LOCATION = os.path.join(os.getenv("XDG_STATE_HOME") or os.path.join(os.getenv("HOME"), '.local/state'),
+								  'dynbsp')
+	CACHE_LOCATION = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.getenv("HOME"), '.cache'),
+								  'dynbsp', 'config.marshal')
 
 	def __init__(self):
-		if not os.path.exists(self.CONFIG_LOCATION):
-			copyfile(self.DEFAULT_LOCATION, self.CONFIG_LOCATION)
-
-	def load_data(self):
-		if os.path.getmtime(Config.CONFIG_LOCATION) != self.last_modified:
-			with open(Config.CONFIG_LOCATION, 'r') as f:
-				data = safe_load(f)
-			self.last_modified = os.path.getmtime(Config.CONFIG_LOCATION)
+		self.cache = ConfigCache(self.CACHE_LOCATION)
+		self._snapshot: Optional[ConfigSnapshot] = None
+
+	def reload(self) -> bool:
+		"""
+		Parse the config file and swap it in. If it can't be parsed, the previous config is kept.
+		The default config is copied into place the first time
+		"""
+		if not os.path.exists(Config.CONFIG_LOCATION):
+			os.makedirs(os.path.dirname(Config.CONFIG_LOCATION), exist_ok=True)
+			copyfile(Config.DEFAULT_LOCATION, Config.CONFIG_LOCATION)
+		try:
+			snapshot = self.load()
+		except Exception as e:
+			if self._snapshot is None:
+				raise
+			error(f"Couldn't reload {Config.CONFIG_LOCATION}, keeping the previous config: {e!r}")
+			return False
+		self._snapshot = snapshot
+		return True
+
+	def load(self) -> ConfigSnapshot:
+		"""
+		Build a snapshot of the config file, from the cache if it was made from the same file.
+		The file is only read if its mtime or size changed, and only parsed if its contents did too
+		"""
+		stat = os.stat(Config.CONFIG_LOCATION)
+		cached = self.cache.read()
+		if cached is not None and cached.stat == (stat.st_mtime_ns, stat.st_size):
+			try:
+				return ConfigSnapshot(cached.data)
+			except Exception as e:
+				debug(f"Ignoring the cached config: {e!r}")
+				cached = None
+		with open(Config.CONFIG_LOCATION, 'rb') as f:
+			content = f.read()
+		digest = sha1(content).hexdigest()
+		snapshot = None
+		if cached is not None and cached.digest == digest:
+			try:
+				data = cached.data
+				snapshot = ConfigSnapshot(data)
+			except Exception as e:
+				debug(f"Ignoring the cached config: {e!r}")
+		if snapshot is None:
+			data = parse_yaml(content)
+			snapshot = ConfigSnapshot(data)
+		self.cache.write(CachedConfig((stat.st_mtime_ns, stat.st_size), digest, data))
+		return snapshot
 
-			self._desktops = set(DesktopConfig(desktop) for desktop in data['desktops'])
-			self._misc_name = data['misc']
-			self._home_desktop = DesktopConfig(data['home'])
+	@property
+	def snapshot(self) -> ConfigSnapshot:
+		if self._snapshot is None:
+			self.reload()
+		return self._snapshot
 
 	@property
 	def desktops(self):
-		self.load_data()
-		return self._desktops
+		return self.snapshot.desktops
 
 	@property
 	def misc_name(self):
-		self.load_data()
-		return self._misc_name
+		return self.snapshot.misc_name
 
 	@property
 	def home_desktop(self):
-		self.load_data()
-		return self._home_desktop
+		return self.snapshot.home_desktop
+
+	@property
+	def rules(self) -> "RuleIndex":
+		return self.snapshot.rules
 
 	def match_node(self, node: Node):
-		for desktop in self.desktops:
-			app = desktop.match_node(node)
-			if app is not None:
-				return app
+		return self.rules.match_node(node)
+
+	def named(self, name: str) -> List["DesktopConfig"]:
+		"""
+		The configured desktops that show up as `name`, collapsed or expanded
+		"""
+		return self.snapshot.names.get(name, [])
 
 	def match_desktop(self, desktop: Desktop):
-		for desk in self.desktops:
+		for desk in self.named(desktop.name):
 			if desk.match(desktop):
 				return desk
 		return None
 
 	def match_desktop_by_applications(self, desktop: Desktop):
-		for desk in self.desktops:
-			if desk.match_applications(desktop):
-				return desk
+		for node in desktop.windows:
+			application = self.match_node(node)
+			if application is not None:
+				return application.desktop
 		return None
 
 	def match_home(self, desktop: Desktop):
 		return self.home_desktop.name == desktop.name
 
-	def get_desktops(self, wm: BSPWM = None, monitor: Monitor = None):
-		if wm is None:
-			wm = get_wm()
-
-		for desktop in self.desktops:
-			desk = desktop.find(wm)
-			if desk is not None and (monitor is None or desk.monitor == monitor):
-				yield desktop
+	def live_configs(self, wm: BSPWM) -> Dict[Desktop, "DesktopConfig"]:
+		"""
+		Which configured desktop each desktop of `wm` is, going by the applications on it. Monitors' home
+		desktops are left out
+		"""
+		configs = {}
+		for monitor in wm.monitors:
+			home = self.get_home(monitor)
+			for desktop in monitor.desktops:
+				if desktop is not home and desktop.root is not None:
+					desk = self.match_desktop_by_applications(desktop)
+					if desk is not None:
+						configs[desktop] = desk
+		return configs
 
 	def get_home(self, monitor: Monitor):
 		for desktop in monitor.desktops:
@@ -84,22 +218,19 @@ class Config:
 
 
 class DesktopConfig:
-	def __init__(self, config):
+	def __init__(self, config, index: int = 0):
 		self.name = config['name']
 		self.extra_name = config.get('extra_name', '')
 		self.order = config.get('order', 9999)
-		self.applications = set()
-		for application in config['applications']:
-			self.applications.add(ApplicationConfig(application, self))
+		self.index = index
+		self.applications = [ApplicationConfig(application, self) for application in config.get('applications', [])]
+		self.rules = RuleIndex(self.applications)
 
 	def __repr__(self):
 		return f"<DynDesktop name: {self.name} extra: {self.extra_name} order: {self.order}>"
 
 	def match_node(self, node: Node):
-		for application in self.applications:
-			if application.match(node):
-				return application
-		return None
+		return self.rules.match_node(node)
 
 	def match(self, desktop: Desktop, exclude_nodes: Set[Node] = None):
 		if desktop.name == self.collapsed_name or desktop.name == self.expanded_name:
@@ -107,7 +238,9 @@ class DesktopConfig:
 		return False
 
 	def match_applications(self, desktop: Desktop, exclude_nodes: Set[Node] = None):
-		for node in desktop.nodes.difference(exclude_nodes if exclude_nodes is not None else set()):
+		for node in desktop.windows:
+			if exclude_nodes and node in exclude_nodes:
+				continue
 			if self.match_node(node):
 				return True
 		return False
@@ -115,25 +248,29 @@ class DesktopConfig:
 	def find(self, wm: BSPWM = None, exclude_nodes: Set[Node] = None):
 		if wm is None:
 			wm = get_wm()
-		for desktop in wm.desktops:
-			if self.match(desktop, exclude_nodes):
-				return desktop
+		for name in dict.fromkeys((self.collapsed_name, self.expanded_name)):
+			for desktop in wm.get_desktops_by_name(name):
+				if self.match_applications(desktop, exclude_nodes):
+					return desktop
 		return None
 
-	def create(self, monitor: Monitor):
-		if len(set(self.get_duplicates(monitor))) == 0:
-			name = self.collapsed_name
-		else:
-			name = self.expanded_name
-
-		desktop = monitor.create_desktop(name)
-		return desktop
-
-	def get_duplicates(self, monitor: Monitor = None, wm: BSPWM = None):
-		desktops = CONFIG.get_desktops(wm, monitor)
-		for desk in desktops:
-			if self.name == desk.name and self != desk:
-				yield desk
+	def create(self, monitor: Monitor, wm: BSPWM = None):
+		"""
+		Add a desktop for this config to `monitor`, already named the way the reconciler will name it
+		once it holds one of the config's applications
+		"""
+		if wm is None:
+			wm = monitor.wm if monitor.wm is not None else get_wm()
+		return monitor.create_desktop(self.live_name(set(CONFIG.live_configs(wm).values())))
+
+	def live_name(self, live: Set["DesktopConfig"]) -> str:
+		"""
+		The name this config's desktop goes by while the configs in `live` have desktops: expanded as long as
+		another config of the same name is among them
+		"""
+		if any(desk.name == self.name and desk is not self for desk in live):
+			return self.expanded_name
+		return self.collapsed_name
 
 	@property
 	def expanded_name(self):
@@ -143,27 +280,11 @@ class DesktopConfig:
 	def collapsed_name(self):
 		return f"{self.name}"
 
-	def update_name(self, desktop: Desktop = None, propagate: bool = True, wm: BSPWM = None):
-		if wm is None:
-			wm = get_wm()
-
-		if desktop is None:
-			desktop = self.find(wm)
-
-		duplicates = set(self.get_duplicates(None, wm))
-		if not duplicates:
-			desktop.rename(self.collapsed_name)
-		else:
-			desktop.rename(self.expanded_name)
-			if propagate:
-				for desk in duplicates:
-					desk.update_name(propagate=False)
-
 
 class ApplicationConfig:
 	def __init__(self, config, desktop: DesktopConfig):
-		self.class_name = compile(config.get("class", ".*"))
-		self.instance_name = compile(config.get("instance", ".*"))
+		self.class_name = Pattern.compile(config.get("class", ".*"))
+		self.instance_name = Pattern.compile(config.get("instance", ".*"))
 		self.desktop = desktop
 
 	def match(self, node: Node):
@@ -175,4 +296,111 @@ class ApplicationConfig:
 		return f"<ApplicationConfig class: {self.class_name.pattern}, instance: {self.instance_name.pattern}>"
 
 
+class Pattern:
+	"""
+	How a rule pattern is matched: a literal prefix (a hash lookup), a wildcard, or a real regex
+	"""
+	WILDCARD = ".*"
+	SPECIAL = set(".^$*+?{}[]\\|()")
+	# Numbered backreferences and conditionals, and named groups, which stop meaning the same thing
+	# (or stop compiling) once the pattern is joined with others into one alternation
+	GROUP_REFERENCES = compile(r"\\[1-9]|\(\?\(|\(\?P")
+
+	@staticmethod
+	def is_literal(pattern: str):
+		return not Pattern.SPECIAL.intersection(pattern)
+
+	@staticmethod
+	def combinable(pattern: str):
+		return not Pattern.GROUP_REFERENCES.search(pattern)
+
+	@staticmethod
+	def compile(pattern: str):
+		"""
+		Only real regexes are compiled: with hundreds of rules, most are literals or wildcards
+		"""
+		if pattern == Pattern.WILDCARD or Pattern.is_literal(pattern):
+			return Literal(pattern)
+		return compile(pattern)
+
+	@staticmethod
+	def matches(compiled, value: str):
+		return bool(compiled.match(value))
+
+
+class Literal:
+	"""
+	Stands in for a compiled pattern without regex syntax, matching the way re.match would
+	"""
+
+	def __init__(self, pattern: str):
+		self.pattern = pattern
+
+	def match(self, value: str) -> bool:
+		return self.pattern == Pattern.WILDCARD or value.startswith(self.pattern)
+
+
+class RuleIndex:
+	"""
+	Finds the rules matching a (class, instance) pair without trying every rule.
+
+	Class patterns without regex syntax are looked up by prefix in a dict (re.match only anchors
+	at the start, so a literal matches any class it's a prefix of), `.*` matches everything, and
+	the remaining patterns are only tried once a single combined alternation says one of them matches.
+	Patterns that refer to their own groups are left out of the alternation, which renumbers groups,
+	and are always tried on their own. Results are memoized per (class, instance); a config reload builds a new index.
+	"""
+
+	CACHE_SIZE = 1024
+
+	def __init__(self, applications: List["ApplicationConfig"]):
+		self.applications = list(applications)
+		self.literals: Dict[str, List[int]] = {}
+		self.wildcards: List[int] = []
+		self.patterns: List[int] = []
+		self.standalone: List[int] = []
+		for priority, application in enumerate(self.applications):
+			pattern = application.class_name.pattern
+			if pattern == Pattern.WILDCARD:
+				self.wildcards.append(priority)
+			elif Pattern.is_literal(pattern):
+				self.literals.setdefault(pattern, []).append(priority)
+			elif Pattern.combinable(pattern):
+				self.patterns.append(priority)
+			else:
+				self.standalone.append(priority)
+		self.lengths = sorted(set(map(len, self.literals)))
+		self.combined = None
+		if self.patterns:
+			try:
+				self.combined = compile("|".join(
+					f"(?:{self.applications[priority].class_name.pattern})" for priority in self.patterns))
+			except PatternError:
+				pass
+		self.matches = lru_cache(maxsize=self.CACHE_SIZE)(self._matches)
+
+	def _matches(self, class_name: str, instance_name: str) -> Tuple["ApplicationConfig", ...]:
+		candidates = list(self.wildcards)
+		for length in self.lengths:
+			if length > len(class_name):
+				break
+			candidates.extend(self.literals.get(class_name[:length], ()))
+		if self.patterns and (self.combined is None or self.combined.match(class_name)):
+			candidates.extend(priority for priority in self.patterns
+							  if self.applications[priority].class_name.match(class_name))
+		candidates.extend(priority for priority in self.standalone
+						  if self.applications[priority].class_name.match(class_name))
+		return tuple(self.applications[priority] for priority in sorted(candidates)
+					 if Pattern.matches(self.applications[priority].instance_name, instance_name))
+
+	def match(self, class_name: str, instance_name: str) -> Optional["ApplicationConfig"]:
+		matches = self.matches(class_name or "", instance_name or "")
+		return matches[0] if matches else None
+
+	def match_node(self, node: Node) -> Optional["ApplicationConfig"]:
+		if node.client is None:
+			return None
+		return self.match(node.client.class_name, node.client.instance_name)
+
+
 CONFIG = Config()
@@ -0,0 +1,133 @@
+"""
+A unix socket the running daemon answers requests on, so other dynbsp commands can ask it things.
+Each connection carries one JSON request, `{"command": ..., "args": {...}}`, and one JSON reply.
+
+Only the daemon's side logs, so the clients that keybindings start don't pay for importing logging.
+"""
+import atexit
+import json
+import os
+import socket
+from typing import Callable, Dict, Optional
+
+
+class ControlError(Exception):
+	pass
+
+
+def socket_path():
+	runtime = os.getenv("XDG_RUNTIME_DIR")
+	if runtime:
+		return os.path.join(runtime, "dynbsp.sock")
+	return f"/tmp/dynbsp-{os.getuid()}.sock"
+
+
+def _receive(sock: socket.socket) -> bytes:
+	chunks = []
+	while True:
+		chunk = sock.recv(65536)
+		if not chunk:
+			return b"".join(chunks)
+		chunks.append(chunk)
+
+
+class ControlServer:
+	def __init__(self, path: str = None, timeout: float = 1.0):
+		self.path = path or socket_path()
+		self.timeout = timeout
+		self.handlers: Dict[str, Callable] = {}
+		self.socket: Optional[socket.socket] = None
+
+	def register(self, name: str):
+		def decorator(f):
+			self.handlers[name] = f
+			return f
+
+		return decorator
+
+	def listen(self):
+		"""
+		Start accepting requests. Only call this from the single running instance: a stale socket is replaced
+		"""
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.bind(self.path)
+		os.chmod(self.path, 0o600)
+		self.socket.listen(8)
+		self.socket.setblocking(False)
+		atexit.register(self.close)
+
+	def fileno(self):
+		return self.socket.fileno()
+
+	def accept(self):
+		"""
+		Answer one pending request
+		"""
+		import logging
+
+		try:
+			connection, _ = self.socket.accept()
+		except BlockingIOError:
+			return
+		with connection:
+			connection.settimeout(self.timeout)
+			try:
+				reply = self.handle(json.loads(_receive(connection)))
+				connection.sendall(json.dumps(reply).encode())
+			except (OSError, ValueError) as e:
+				logging.warning(f"Couldn't answer a control request: {e!r}")
+
+	def handle(self, request: dict) -> dict:
+		import logging
+
+		handler = self.handlers.get(request.get("command"))
+		if handler is None:
+			return {"error": f"Unknown command {request.get('command')!r}"}
+		try:
+			return {"result": handler(**request.get("args", {}))}
+		except Exception as e:
+			logging.warning(f"Exception caught while answering {request.get('command')!r}", exc_info=True)
+			return {"error": repr(e)}
+
+	def close(self):
+		if self.socket is not None:
+			self.socket.close()
+			self.socket = None
+			if os.path.exists(self.path):
+				os.unlink(self.path)
+
+
+def request(command: str, path: str = None, timeout: float = 5.0, **args):
+	"""
+	Send a request to the running daemon and return its result.
+	Raises OSError if no daemon is listening, and ControlError if the daemon couldn't carry it out
+	"""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		sock.settimeout(timeout)
+		sock.connect(path or socket_path())
+		sock.sendall(json.dumps({"command": command, "args": args}).encode())
+		sock.shutdown(socket.SHUT_WR)
+		reply = json.loads(_receive(sock))
+	if "error" in reply:
+		raise ControlError(reply["error"])
+	return reply["result"]
+
+
+def run_in_daemon(command: str, **args) -> bool:
+	"""
+	Have the running instance carry out `command`, so it's done against its warm state and config
+	instead of by this process. Returns False if there's no instance to ask
+	"""
+	try:
+		request(command, **args)
+	except socket.timeout:
+		print(f"dynbsp didn't finish {command} in time")
+		raise SystemExit(1)
+	except OSError:
+		return False
+	except ControlError as e:
+		print(f"dynbsp couldn't {command}: {e}")
+		raise SystemExit(1)
+	return True
@@ -1,17 +1,139 @@
 #!/usr/bin/env python
+import atexit
 import logging
+import os
+import signal
+from typing import Set
 
 from .config import CONFIG
-from .helpers import clear_empty_desktops, new_misc_desktop, \
- reorder, update_names, new_monitor_added
+from .control import ControlServer
+from .logs import Logs
+from .reconciler import reconcile
+from .helpers import new_misc_desktop, new_monitor_added, remove_old_monitors, picture_in_picture
 from .pybspc import *
-
-logging.basicConfig(filename='dynbspwm.log',
-					format='%(asctime)s | %(filename)s:%(lineno)d | %(funcName)s | %(levelname)s | %(message)s',
-					level=logging.DEBUG)
-logging.getLogger().addHandler(logging.StreamHandler())
+from .pybspc.connection import CONNECTION
+from .watcher import FileWatcher
 
 sub = Subscriber()
+logs = Logs()
+# Monitors a window has left since the last reconcile, the only ones whose empty desktops it removes
+emptied: Set[int] = set()
+
+
+def start_logging(level: str = "INFO"):
+	"""
+	Log at `level` to stderr and to a rotating file in the state directory, from a background thread
+	"""
+	logs.start(level, os.path.join(CONFIG.STATE_LOCATION, 'dynbsp.log'))
+	atexit.register(logs.stop)
+
+
+def watch_config():
+	"""
+	Reload the config whenever it's saved, then bring the desktops in line with it
+	"""
+	watcher = FileWatcher(CONFIG.CONFIG_LOCATION)
+
+	def config_changed():
+		if watcher.read() and CONFIG.reload():
+			logging.info("Config reloaded")
+			sub.defer(reconcile_burst)
+
+	sub.add_reader(watcher, config_changed)
+
+
+control = ControlServer()
+
+
+@control.register("stats")
+def stats():
+	return sub.metrics.to_dict(CONNECTION.sent, CONNECTION.trees)
+
+
+@control.register("logs")
+def recent_logs(count: int = None):
+	"""
+	The most recent log records at every level, whatever level is being written out
+	"""
+	return {"lines": logs.recent.lines(count), "dropped": logs.dropped}
+
+
+@control.register("profile")
+def profile(action: str = "toggle"):
+	"""
+	Start or stop profiling the handlers. Stopping writes the profiles to the state directory
+	"""
+	profiler = sub.profiler
+	if action == "toggle":
+		action = "stop" if profiler.active else "start"
+	if action == "start":
+		profiler.start()
+		logging.info("Profiling started")
+		return {"active": True, "files": []}
+	if action == "stop":
+		files = profiler.stop(CONFIG.STATE_LOCATION)
+		logging.info(f"Profiling stopped, wrote {', '.join(files) or 'nothing'}")
+		return {"active": False, "files": files}
+	return {"active": profiler.active, "files": []}
+
+
+# One-shot commands, run against the daemon's warm state rather than by a freshly started process
+
+
+@control.register("pip")
+def pip():
+	picture_in_picture()
+
+
+@control.register("new-desktop")
+def new_desktop(move: bool = False):
+	new_misc_desktop(move)
+
+
+@control.register("reconcile")
+def reconcile_desktops(dry_run: bool = False):
+	return reconcile(dry_run=dry_run)
+
+
+@control.register("multimonitor")
+def multimonitor(dry_run: bool = False):
+	# No event says when a monitor stops being wired, so that has to be read fresh
+	return remove_old_monitors(BSPWM.get(), dry_run=dry_run)
+
+
+def handle_signals():
+	"""
+	Toggle profiling on SIGUSR1. The signal only wakes up the event loop, which does the actual work
+	"""
+	read_fd, write_fd = os.pipe()
+	os.set_blocking(read_fd, False)
+	os.set_blocking(write_fd, False)
+	signal.set_wakeup_fd(write_fd)
+	signal.signal(signal.SIGUSR1, lambda signum, frame: None)
+
+	def signalled():
+		for signum in os.read(read_fd, 64):
+			if signum == signal.SIGUSR1:
+				profile("toggle")
+
+	sub.add_reader(read_fd, signalled)
+
+
+def serve_control():
+	"""
+	Answer requests from other dynbsp commands (see `control.request`) from the event loop
+	"""
+	control.listen()
+	sub.add_reader(control, control.accept)
+
+
+def reconcile_burst():
+	"""
+	Reconcile once a burst of events has been handled
+	"""
+	monitors = set(emptied)
+	emptied.clear()
+	reconcile(emptied=monitors)
 
 
 @sub.event('node_add')
@@ -23,22 +145,23 @@ def node_added(wm: BSPWM, monitor: Monitor, desktop: Desktop, node: Node):
 			target_desktop = app_config.desktop.create(wm.current_monitor)
 		if desktop != target_desktop:
 			node.to_desktop(target_desktop)
-		app_config.desktop.update_name(target_desktop, wm)
 	else:
 		if CONFIG.match_home(desktop):
 			new_misc_desktop(True, node, wm)
-	reorder(get_wm())
+	sub.defer(reconcile_burst)
 	logging.info(f"Node added {node}, {desktop}")
 
 
 @sub.event('node_remove')
 def node_removed(wm: BSPWM, monitor: Monitor, desktop: Desktop, node: Node):
-	clear_empty_desktops(monitor)
+	if monitor is not None:
+		emptied.add(monitor.id)
+	sub.defer(reconcile_burst)
 
 
 @sub.event('desktop_remove')
 def desktop_removed(wm, monitor: Monitor, desktop: Desktop):
-	update_names(wm)
+	sub.defer(reconcile_burst)
 
 
 @sub.event('monitor_add')
@@ -46,7 +169,15 @@ def monitor_add(wm, monitor: Monitor):
 	new_monitor_added(monitor, wm)
 
 
+@sub.event('monitor_remove')
+def monitor_removed(wm, event):
+	# bspwm has moved the monitor's desktops, home desktop included, to another monitor
+	sub.defer(remove_old_monitors)
+
+
 @sub.event('node_transfer')
 def node_transfer(wm, src_monitor: Monitor, src_desktop: Desktop, src_node: Node, dst_monitor: Monitor,
 					dst_desktop: Desktop, dst_node: Node):
-	clear_empty_desktops(src_monitor)
+	if src_monitor is not None:
+		emptied.add(src_monitor.id)
+	sub.defer(reconcile_burst)
@@ -1,13 +1,17 @@
-from typing import Union
+from typing import List, Optional
 
 from .config import CONFIG
-from .pybspc import Monitor, BSPWM, get_wm, Node, run, ClientState, NodeFlag, Rect
+from .migration import Migration
+from .reconciler import reconcile
+from .pybspc import Monitor, BSPWM, get_wm, Node, ClientState, NodeFlag, Rect, Transaction
 
 
-def clear_empty_desktops(container: Union[BSPWM, Monitor]):
-	for desktop in container.desktops:
-		if len(desktop.nodes) == 0 and not CONFIG.match_home(desktop):
-			desktop.delete()
+def focused_node() -> Optional[Node]:
+	"""
+	Node focus and geometry aren't subscribed to, so a running instance's mirror can't be trusted to know
+	which node has focus, nor where it is. Fetch the node itself instead
+	"""
+	return Node.get("focused")
 
 
 def new_misc_desktop(move=False, node: Node = None, wm: BSPWM = None):
@@ -16,100 +20,59 @@ def new_misc_desktop(move=False, node: Node = None, wm: BSPWM = None):
 	desk = wm.current_monitor.create_desktop(CONFIG.misc_name)
 	if move:
 		if node is None:
-			node = wm.current_monitor.current_desktop.current_node
-		node.to_desktop(desk, follow=True)
+			node = focused_node()
+		if node is not None:
+			node.to_desktop(desk, follow=True)
 
 
-def rename_all(wm: BSPWM = None):
+def migrate(wm: BSPWM = None, added: Monitor = None, dry_run=False) -> Optional[List[str]]:
+	"""
+	Move desktops to where they belong now that monitors have come or gone (see `Migration.plan`),
+	then reconcile what's left: home desktops, names and order. With `dry_run`, only return what would be done
+	"""
 	if wm is None:
 		wm = get_wm()
-	for desktop in wm.desktops:
-		desk = CONFIG.match_desktop_by_applications(desktop)
-		if desk is not None:
-			desk.update_name(desktop, wm)
-
-
-def update_names(wm: BSPWM = None):
-	if wm is None:
-		wm = get_wm()
-	for desktop in CONFIG.get_desktops(wm):
-		desktop.update_name(wm=wm)
-
-
-def create_home(wm: BSPWM = None):
-	if wm is None:
+	migration = Migration.plan(wm, added)
+	if dry_run:
+		if migration:
+			# What reconciling has to do depends on the tree the migration leaves behind
+			return migration.describe() + ["reconcile the desktops that are left"]
+		return reconcile(wm, dry_run=True)
+	if migration:
+		migration.apply()
+		# The tree changed under `wm`; a running instance's mirror has caught up by now
 		wm = get_wm()
-	for monitor in wm.monitors:
-		if CONFIG.get_home(monitor) is None:
-			# monitor.create_desktop()
-			CONFIG.home_desktop.create(monitor)
+	reconcile(wm)
+	return None
 
 
-def reorder(wm: BSPWM = None):
-	if wm is None:
-		wm = get_wm()
+def remove_old_monitors(wm: BSPWM = None, dry_run=False) -> Optional[List[str]]:
+	return migrate(wm, dry_run=dry_run)
 
-	def _remove_duplicates(seq):
-		seen = set()
-		seen_add = seen.add
-		return [x for x in seq if not (x in seen or seen_add(x))]
 
-	for monitor in wm.monitors:
-		ordered = [
-			desktop.find(wm) for desktop in sorted(CONFIG.get_desktops(wm, monitor), key=lambda desktop: desktop.order)
-		]
-		ordered.insert(0, CONFIG.get_home(monitor))
-		ordered = _remove_duplicates(ordered)
-		not_included = [desktop for desktop in monitor.desktops if desktop not in ordered]
-		ordered = ordered + not_included
-		monitor.reorder(ordered)
+def new_monitor_added(monitor: Monitor, wm: BSPWM = None):
+	migrate(wm, added=monitor)
 
 
-def remove_old_monitors(wm: BSPWM = None):
+def picture_in_picture(wm: BSPWM = None):
 	if wm is None:
 		wm = get_wm()
-	xrandr = run('xrandr').read()
-	laptop_monitor = next((monitor for monitor in wm.monitors if monitor.name == "eDP1"))
-	for monitor in wm.monitors:
-		if f"{monitor.name} connected" not in xrandr:
-			for desktop in monitor.desktops:
-				if CONFIG.match_home(desktop):
-					if len(desktop.nodes) > 0:
-						misc = laptop_monitor.create_desktop(CONFIG.misc_name)
-						for node in desktop.nodes:
-							node.to_desktop(misc)
-				else:
-					desktop.to_monitor(laptop_monitor)
-			monitor.remove()
-	reorder(wm)
-
-
-def new_monitor_added(monitor: Monitor, wm: BSPWM = None):
-	create_home()
-	clear_empty_desktops(monitor)
-	laptop_monitor = next((monitor for monitor in wm.monitors if monitor.name == "eDP1"))
-	if "HDMI" in monitor.name:
-		for desktop in laptop_monitor.desktops:
-			if not CONFIG.match_home(desktop):
-				desktop.to_monitor(monitor)
-		reorder(wm)
-
-
-def picture_in_picture():
-	wm = get_wm()
-	current_node = wm.current_monitor.current_desktop.current_node
-	if current_node.sticky and current_node.client.state is ClientState.FLOATING:
-		current_node.set_state(ClientState.TILED)
-		current_node.set_flag(NodeFlag.STICKY, False)
-	else:
-		current_node.set_state(ClientState.FLOATING)
-		current_node.set_flag(NodeFlag.STICKY, True)
-
-		monitor_rect = wm.current_monitor.rectangle
-		monitor_padding = wm.current_monitor.padding
-		extra_padding = wm.current_monitor.window_gap - wm.current_monitor.border_width
-		w = round(monitor_rect.width * 0.3)
-		h = round(monitor_rect.height * 0.3)
-		x = monitor_rect.x + monitor_rect.width - w - monitor_padding.right - extra_padding
-		y = monitor_rect.y + monitor_rect.height - h - monitor_padding.bottom - extra_padding
-		current_node.set_rect(Rect(x, y, w, h))
+	current_node = focused_node()
+	if current_node is None:
+		return
+	with Transaction():
+		if current_node.sticky and current_node.client.state is ClientState.FLOATING:
+			current_node.set_state(ClientState.TILED)
+			current_node.set_flag(NodeFlag.STICKY, False)
+		else:
+			current_node.set_state(ClientState.FLOATING)
+			current_node.set_flag(NodeFlag.STICKY, True)
+
+			monitor_rect = wm.current_monitor.rectangle
+			monitor_padding = wm.current_monitor.padding
+			extra_padding = wm.current_monitor.window_gap - wm.current_monitor.border_width
+			w = round(monitor_rect.width * 0.3)
+			h = round(monitor_rect.height * 0.3)
+			x = monitor_rect.x + monitor_rect.width - w - monitor_padding.right - extra_padding
+			y = monitor_rect.y + monitor_rect.height - h - monitor_padding.bottom - extra_padding
+			current_node.set_rect(Rect(x, y, w, h))
@@ -0,0 +1,94 @@
+"""
+Logging for the daemon, kept off the event loop: handlers only put records on a bounded queue, and a background
+thread writes them out, so a slow disk never holds up window placement. If the queue fills up, records are dropped
+and counted rather than waited for.
+"""
+import logging
+import os
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Full, Queue
+from typing import List, Optional
+
+FORMAT = '%(asctime)s | %(filename)s:%(lineno)d | %(funcName)s | %(levelname)s | %(message)s'
+
+
+class DroppingQueueHandler(QueueHandler):
+	def __init__(self, queue: Queue):
+		super().__init__(queue)
+		self.dropped = 0
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except Full:
+			self.dropped += 1
+
+
+class RecentRecords(logging.Handler):
+	"""
+	The last `capacity` records at any level, kept in memory and only formatted when they're asked for
+	"""
+
+	def __init__(self, capacity: int):
+		super().__init__(logging.DEBUG)
+		self.records = deque(maxlen=capacity)
+		self.setFormatter(logging.Formatter(FORMAT))
+
+	def emit(self, record):
+		self.records.append(record)
+
+	def lines(self, count: int = None) -> List[str]:
+		with self.lock:
+			records = list(self.records)
+		if count is not None:
+			records = records[-count:] if count > 0 else []
+		return [self.format(record) for record in records]
+
+
+class Logs:
+	def __init__(self, queue_size: int = 10000, recent: int = 1000, max_bytes: int = 1 << 20, backups: int = 3):
+		self.queue_size = queue_size
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self.recent = RecentRecords(recent)
+		self.handler: Optional[DroppingQueueHandler] = None
+		self.listener: Optional[QueueListener] = None
+
+	@property
+	def dropped(self):
+		return self.handler.dropped if self.handler is not None else 0
+
+	def start(self, level=logging.INFO, path: str = None):
+		"""
+		Send records at `level` and above to stderr and to a rotating log file at `path`,
+		and keep recent records of every level in memory
+		"""
+		if self.listener is not None:
+			return
+		formatter = logging.Formatter(FORMAT)
+		outputs = [logging.StreamHandler()]
+		if path is not None:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			outputs.append(RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups))
+		for output in outputs:
+			output.setFormatter(formatter)
+		self.handler = DroppingQueueHandler(Queue(self.queue_size))
+		self.handler.setLevel(level)
+		self.listener = QueueListener(self.handler.queue, *outputs)
+
+		root = logging.getLogger()
+		for handler in root.handlers[:]:
+			root.removeHandler(handler)
+		root.addHandler(self.handler)
+		root.addHandler(self.recent)
+		root.setLevel(logging.DEBUG)
+		self.listener.start()
+
+	def stop(self):
+		"""
+		Write out everything still queued
+		"""
+		if self.listener is not None:
+			self.listener.stop()
+			self.listener = None
@@ -0,0 +1,97 @@
+"""
+Moving desktops between monitors when outputs are plugged in or unplugged.
+
+A `Migration` is planned from the whole tree in one go, then carried out as a single batch: each home
+desktop's windows move as one subtree, every desktop that changes monitor is moved in the same pipelined
+transaction, and the monitors are reordered once at the end.
+"""
+from typing import List, Optional
+
+from .config import CONFIG
+from .pybspc import BSPWM, Desktop, Monitor, Transaction
+
+
+def main_monitor(wm: BSPWM, added: Monitor = None) -> Optional[Monitor]:
+	"""
+	Where desktops are gathered: the monitor that was just plugged in, or otherwise (at startup, and when one is
+	unplugged) bspwm's primary monitor, or failing that the first one that's still connected
+	"""
+	if added is not None and added.wired:
+		return added
+	primary = wm.primary_monitor
+	if primary is not None and primary.wired:
+		return primary
+	wired = [monitor for monitor in wm.monitors if monitor.wired]
+	return wired[0] if wired else None
+
+
+class Migration:
+	def __init__(self, target: Monitor):
+		self.target = target
+		# Home desktops whose windows get a new misc desktop on the target, as the target has its own home
+		self.homes: List[Desktop] = []
+		self.desktops: List[Desktop] = []
+		# Home desktops left over once their windows have moved
+		self.removed_desktops: List[Desktop] = []
+		self.removed_monitors: List[Monitor] = []
+		# Monitors every desktop moves off of, which need one more first: bspwm won't move a monitor's last desktop
+		self.placeholders: List[Monitor] = []
+
+	@staticmethod
+	def plan(wm: BSPWM, added: Monitor = None) -> Optional["Migration"]:
+		"""
+		Empty unplugged monitors onto the main monitor and remove them, and fold a monitor's extra home desktops
+		(bspwm merges an unplugged monitor's desktops into another one when it removes it itself) into misc
+		desktops. When `added` has just been plugged in and becomes the main monitor, every other monitor's
+		desktops move to it too
+		"""
+		target = main_monitor(wm, added)
+		if target is None:
+			return None
+		migration = Migration(target)
+		for monitor in wm.monitors:
+			unplugged = not monitor.wired
+			gather = monitor is not target and (unplugged or target is added)
+			home = CONFIG.get_home(monitor)
+			for desktop in monitor.desktops:
+				if CONFIG.match_home(desktop):
+					if desktop is home and not unplugged:
+						continue
+					if desktop.root is not None:
+						migration.homes.append(desktop)
+					if not unplugged:
+						migration.removed_desktops.append(desktop)
+				elif gather:
+					migration.desktops.append(desktop)
+			moving = set(migration.desktops).union(migration.removed_desktops)
+			if monitor.desktops and moving.issuperset(monitor.desktops):
+				migration.placeholders.append(monitor)
+			if unplugged:
+				migration.removed_monitors.append(monitor)
+		return migration
+
+	def __bool__(self):
+		return bool(self.homes or self.desktops or self.removed_desktops or self.removed_monitors)
+
+	def describe(self) -> List[str]:
+		lines = [f"move the windows of {desktop} to a new {CONFIG.misc_name!r} desktop" for desktop in self.homes]
+		lines += [f"add a {CONFIG.misc_name!r} desktop to {monitor}, so its last one can leave" for monitor in self.placeholders]
+		lines += [f"move {desktop} to {self.target}" for desktop in self.desktops]
+		lines += [f"remove {desktop}" for desktop in self.removed_desktops]
+		lines += [f"remove {monitor}" for monitor in self.removed_monitors]
+		return lines
+
+	def apply(self):
+		# The misc desktops have to exist before windows can be sent to them
+		miscs = self.target.create_desktops([CONFIG.misc_name] * len(self.homes)) if self.homes else []
+		for monitor in self.placeholders:
+			monitor.create_desktop(CONFIG.misc_name)
+		with Transaction():
+			for home, misc in zip(self.homes, miscs):
+				home.move_nodes(misc)
+			for desktop in self.desktops:
+				desktop.to_monitor(self.target)
+			for desktop in self.removed_desktops:
+				desktop.delete()
+			for monitor in self.removed_monitors:
+				monitor.remove()
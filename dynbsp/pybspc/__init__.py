@@ -2,11 +2,17 @@ from .bspwm import BSPWM
 from .desktop import Desktop
 from .monitor import Monitor
 from .node import Node, ClientState, NodeFlag
+from .state import State
 from .subscription import Subscriber
-from .utils import run, Rect
+from .utils import run, command, Rect, Transaction, Operation
+from .connection import Connection, MessageTooLong, Reply
+from .events import Event, parse_event
+from .query import Query, selector
 
 
 def get_wm():
+	if State.live is not None:
+		return State.live.sync()
 	return BSPWM.get()
 
 
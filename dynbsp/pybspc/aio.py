@@ -0,0 +1,318 @@
+"""
+asyncio flavour of pybspc: awaitable commands and queries, an async subscription stream,
+and a subscriber whose handlers may be coroutines.
+
+	sub = AsyncSubscriber()
+
+	@sub.event('desktop_remove')
+	async def desktop_removed(wm, monitor, desktop):
+		await gather(*(["desktop", d.id, "--rename", d.name.strip()] for d in monitor.desktops))
+
+	asyncio.run(sub.listen())
+"""
+import asyncio
+from asyncio.subprocess import PIPE
+from inspect import isawaitable
+from json import loads
+from logging import debug, error, warning
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from .bspwm import BSPWM
+from .connection import CONNECTION, FAILURE_MESSAGE
+from .events import Event, parse_event
+from .query import Query
+from .state import State
+from .subscription import Subscriber
+
+
+class AsyncReply:
+	"""
+	The response to a message sent with `send`. It has been read in full, so nothing here blocks
+	"""
+
+	def __init__(self, output: bytes, err: bytes, failed: bool = False):
+		self._output = output
+		self._error = err
+		self._failed = failed
+
+	@property
+	def failed(self):
+		return self._failed
+
+	def read(self):
+		return self._output.strip().decode('utf-8')
+
+	def json(self):
+		return loads(self.read())
+
+	def error(self) -> Optional[str]:
+		if not self._failed:
+			return None
+		return self._error.strip().decode('utf-8')
+
+	def wait(self, timeout=None):
+		if self._failed:
+			error(self.error() or "bspwm reported a failure without a message")
+
+
+async def send(args: Iterable) -> AsyncReply:
+	"""
+	Send a message (the arguments that would follow `bspc`) over the bspwm socket,
+	falling back to an asyncio subprocess when the socket can't be reached
+	"""
+	args = [str(arg) for arg in args]
+	message = CONNECTION.encode(args)
+	CONNECTION.check(message)
+	CONNECTION.count(args)
+	try:
+		reader, writer = await asyncio.open_unix_connection(CONNECTION.path)
+	except OSError:
+		process = await asyncio.create_subprocess_exec("bspc", *args, stdout=PIPE, stderr=PIPE)
+		output, err = await process.communicate()
+		return AsyncReply(output, err, failed=process.returncode != 0)
+	writer.write(message)
+	writer.write_eof()
+	await writer.drain()
+	response = await reader.read()
+	writer.close()
+	if response.startswith(FAILURE_MESSAGE):
+		return AsyncReply(b"", response[len(FAILURE_MESSAGE):], failed=True)
+	return AsyncReply(response, b"")
+
+
+async def command(domain: str, selector, *args) -> AsyncReply:
+	reply = await send([domain, selector, *args])
+	reply.wait()
+	return reply
+
+
+async def gather(*messages: Iterable) -> List[AsyncReply]:
+	"""
+	Send independent messages concurrently, returning their replies in the same order
+	"""
+	replies = await asyncio.gather(*(send(message) for message in messages))
+	for reply in replies:
+		reply.wait()
+	return replies
+
+
+async def get_wm() -> BSPWM:
+	return BSPWM((await send(["wm", "--dump-state"])).json())
+
+
+async def tree(query: Query) -> Optional[dict]:
+	"""
+	Awaitable `Query.tree`
+	"""
+	reply = await send(query.tree_arguments()[1:])
+	output = reply.read()
+	if reply.failed or not output:
+		return None
+	return loads(output)
+
+
+async def open_subscription(*events: str) -> Tuple[asyncio.StreamReader, object]:
+	"""
+	Subscribe to events, returning the stream to read them from and the object that keeps it open
+	"""
+	args = ["subscribe", *(events or ["all"])]
+	try:
+		reader, writer = await asyncio.open_unix_connection(CONNECTION.path)
+	except OSError:
+		process = await asyncio.create_subprocess_exec("bspc", *args, stdout=PIPE)
+		return process.stdout, process
+	writer.write(CONNECTION.encode(args))
+	writer.write_eof()
+	await writer.drain()
+	return reader, writer
+
+
+async def read_events(stream: asyncio.StreamReader) -> AsyncIterator[str]:
+	while True:
+		line = await stream.readline()
+		if not line:
+			return
+		message = line.strip().decode('utf-8', errors='replace')
+		if message:
+			yield message
+
+
+async def subscribe(*events: str) -> AsyncIterator[str]:
+	"""
+	Yield events as bspwm reports them, for as long as the subscription stays open
+	"""
+	stream, _connection = await open_subscription(*events)
+	async for message in read_events(stream):
+		yield message
+
+
+class Unfetched(Exception):
+	def __init__(self, query: Query):
+		super().__init__(query)
+		self.query = query
+
+
+class AsyncState(State):
+	"""
+	The state mirror for an event loop. bspwm serves one connection at a time, reading each message in full,
+	so a blocking refetch on the loop would wait for bspwm while bspwm waits for a handler's half-sent message.
+	Instead, applying an event stops at the first part of the tree it needs, that part is fetched with an
+	awaitable query, and the event is applied again until everything it needs is in
+	"""
+
+	def __init__(self, wm: BSPWM):
+		super().__init__(None, wm)
+		self.trees: Dict[tuple, Optional[dict]] = {}
+
+	def tree(self, query: Query) -> Optional[dict]:
+		key = tuple(query.tree_arguments())
+		if key not in self.trees:
+			raise Unfetched(query)
+		return self.trees[key]
+
+	def resync(self):
+		raise RuntimeError("AsyncState resyncs with resync_async")
+
+	async def resync_async(self):
+		debug("Resyncing bspwm state")
+		self.wm = await get_wm()
+
+	async def apply_async(self, event: Event):
+		action = self.actions.get(event.NAME)
+		if action is None:
+			return
+		try:
+			while True:
+				try:
+					# Actions only change the mirror once they have what they fetch, so running one again is safe
+					applied = action(event)
+					break
+				except Unfetched as missing:
+					self.trees[tuple(missing.query.tree_arguments())] = await tree(missing.query)
+		except Exception as e:
+			warning(f"Couldn't apply {event} ({e!r}), resyncing")
+			applied = False
+		finally:
+			self.trees = {}
+		if applied is False:
+			await self.resync_async()
+
+
+class AsyncSubscriber(Subscriber):
+	"""
+	A `Subscriber` that runs on an asyncio event loop. Handlers registered with `event` and callbacks
+	passed to `defer` may be coroutine functions; plain functions still work, but should talk to bspwm through
+	this module rather than the blocking pybspc calls, which would hold up the loop
+	"""
+
+	def __init__(self, debounce: float = 0.0, max_delay: float = 1.0):
+		super().__init__(debounce, max_delay)
+		self.queue: Optional[asyncio.Queue] = None
+		self._reader: Optional[asyncio.Future] = None
+
+	def subscribe(self):
+		# A handler was registered while listening
+		asyncio.ensure_future(self.subscribe_async())
+
+	async def subscribe_async(self):
+		"""
+		(Re)subscribe to the events that have handlers, plus the ones the state mirror needs
+		"""
+		self.topics = State.EVENTS.union(self.events)
+		stream, subscription = await open_subscription(*sorted(self.topics))
+		if self._reader is not None:
+			self._reader.cancel()
+		if isinstance(self.subscription, asyncio.subprocess.Process):
+			self.subscription.terminate()
+		elif self.subscription is not None:
+			self.subscription.close()
+		self.subscription = subscription
+		if self.state is None:
+			self.state = AsyncState(await get_wm())
+		else:
+			await self.state.resync_async()
+		self._reader = asyncio.ensure_future(self._read(stream, self.queue))
+
+	async def listen(self):
+		self.queue = asyncio.Queue()
+		await self.subscribe_async()
+		try:
+			while True:
+				event = await self.queue.get()
+				if event is None:
+					return
+				await self.handle_async(event)
+				if not await self.drain_async(self.queue):
+					return
+				await self.run_deferred_async()
+		finally:
+			self._reader.cancel()
+
+	async def _read(self, stream: asyncio.StreamReader, queue: asyncio.Queue):
+		async for message in read_events(stream):
+			event = parse_event(message)
+			if event is not None:
+				await self.state.apply_async(event)
+				queue.put_nowait(event)
+		warning("bspwm subscription closed")
+		queue.put_nowait(None)
+
+	async def drain_async(self, queue: asyncio.Queue) -> bool:
+		"""
+		Handle the rest of the current burst. Returns False once the subscription has closed
+		"""
+		deadline = monotonic() + self.max_delay
+		while True:
+			while not queue.empty():
+				event = queue.get_nowait()
+				if event is None:
+					return False
+				await self.handle_async(event)
+			timeout = min(self.debounce, deadline - monotonic())
+			if timeout <= 0:
+				return True
+			try:
+				event = await asyncio.wait_for(queue.get(), timeout)
+			except asyncio.TimeoutError:
+				return True
+			if event is None:
+				return False
+			await self.handle_async(event)
+
+	async def handle_async(self, event: Event):
+		handler = self.events.get(event.NAME)
+		if handler is None:
+			return
+		sent = CONNECTION.snapshot()
+		start = perf_counter()
+		try:
+			# Handlers are awaited one at a time, so only one profile is ever enabled. The mirror's refetches
+			# made while the handler waits land in its profile too
+			with self.profiler.profile(handler.__name__):
+				result = handler(*event.arguments(self.state.wm))
+				if isawaitable(result):
+					await result
+		except Exception:
+			warning(f"Exception caught while handling {event}", exc_info=True)
+		elapsed = perf_counter() - start
+		# The reader keeps refetching for the mirror meanwhile, so its fetches can land here too
+		sent = CONNECTION.since(sent)
+		self.metrics.observe_event(event.NAME, elapsed, sent)
+		self.metrics.observe_handler(handler.__name__, elapsed, sent)
+
+	async def run_deferred_async(self):
+		while self.deferred:
+			pending, self.deferred = self.deferred, {}
+			for callback, args in pending:
+				sent = CONNECTION.snapshot()
+				start = perf_counter()
+				try:
+					debug("Running deferred %s", callback.__name__)
+					with self.profiler.profile(callback.__name__):
+						result = callback(*args)
+						if isawaitable(result):
+							await result
+				except Exception:
+					warning(f"Exception caught while running deferred {callback.__name__}", exc_info=True)
+				self.metrics.observe_handler(callback.__name__, perf_counter() - start, CONNECTION.since(sent))
@@ -1,25 +1,72 @@
 from json import loads
 from json.decoder import JSONDecodeError
 from logging import error
-from typing import Set
+from typing import Dict, List, Optional, Set
 
 from .desktop import Desktop
 from .monitor import Monitor
 from .node import Node
-from .utils import run, _int
+from .utils import execute, _int
 
 
 class BSPWM:
 	def __init__(self, data):
 		self.data = data
-		self.monitors = set()
+		self._monitors: Dict[int, Monitor] = {}
+		self._desktops: Dict[int, Desktop] = {}
+		# Node id -> the desktop holding it, built the first time a node is looked up by id alone
+		self._owners: Optional[Dict[int, Desktop]] = None
+		# Desktop name -> desktops carrying it, keyed by id. Desktop names don't have to be unique
+		self._names: Dict[str, Dict[int, Desktop]] = {}
 
 		for monitor in data["monitors"]:
-			self.monitors.add(Monitor(monitor))
+			self.add_monitor(Monitor(monitor))
+
+	def add_monitor(self, monitor: Monitor):
+		monitor.wm = self
+		self._monitors[monitor.id] = monitor
+		for desktop in monitor.desktops:
+			self._index(desktop)
+
+	def remove_monitor(self, monitor: Monitor):
+		del self._monitors[monitor.id]
+		for desktop in monitor.desktops:
+			self._forget(desktop)
+
+	def _index(self, desktop: Desktop):
+		self._desktops[desktop.id] = desktop
+		self._names.setdefault(desktop.name, {})[desktop.id] = desktop
+		if self._owners is not None:
+			self._owners.update(dict.fromkeys(desktop.node_data, desktop))
+
+	def _forget(self, desktop: Desktop):
+		if self._desktops.get(desktop.id) is desktop:
+			del self._desktops[desktop.id]
+			self._unname(desktop, desktop.name)
+		if self._owners is not None:
+			for node_id in desktop.node_data:
+				if self._owners.get(node_id) is desktop:
+					del self._owners[node_id]
+
+	def _unname(self, desktop: Desktop, name: str):
+		named = self._names.get(name)
+		if named is not None and named.get(desktop.id) is desktop:
+			del named[desktop.id]
+			if not named:
+				del self._names[name]
+
+	def _rename(self, desktop: Desktop, old_name: str):
+		if self._desktops.get(desktop.id) is desktop:
+			self._unname(desktop, old_name)
+			self._names.setdefault(desktop.name, {})[desktop.id] = desktop
+
+	@property
+	def monitors(self):
+		return self._monitors.values()
 
 	@staticmethod
 	def get():
-		inp = run("bspc wm -d").read()
+		inp = execute(["bspc", "wm", "-d"]).read()
 		try:
 			data = loads(inp)
 		except JSONDecodeError as e:
@@ -31,11 +78,11 @@ class BSPWM:
 
 	@property
 	def nodes(self) -> Set[Node]:
-		return set().union(*(d.nodes for d in self.desktops))
+		return {node for desktop in self._desktops.values() for node in desktop.nodes}
 
 	@property
 	def desktops(self) -> Set[Desktop]:
-		return set().union(*(m.desktops for m in self.monitors))
+		return set(self._desktops.values())
 
 	@property
 	def current_monitor(self):
@@ -43,8 +90,14 @@ class BSPWM:
 		return self.get_monitor(monitor_id)
 
 	def get_monitor(self, monitor_id):
-		monitor_id = _int(monitor_id)
-		return next((monitor for monitor in self.monitors if monitor.id == monitor_id), None)
+		return self._monitors.get(_int(monitor_id))
+
+	@property
+	def primary_monitor(self) -> Optional[Monitor]:
+		"""
+		The RandR primary output's monitor, if one is set
+		"""
+		return self.get_monitor(self.data.get("primaryMonitorId", 0))
 
 	def pretty_print(self, indent=0):
 		print("|\t" * indent, f"<BSPWM monitors: [", sep="")
@@ -53,9 +106,14 @@ class BSPWM:
 		print("|\t" * indent, "]>", sep="")
 
 	def get_desktop(self, desktop_id):
-		desktop_id = _int(desktop_id)
-		return next((desktop for desktop in self.desktops if desktop.id == desktop_id), None)
+		return self._desktops.get(_int(desktop_id))
+
+	def get_desktops_by_name(self, name: str) -> List[Desktop]:
+		return list(self._names.get(name, {}).values())
 
 	def get_node(self, node_id):
 		node_id = _int(node_id)
-		return next((node for node in self.nodes if node.id == node_id), None)
+		if self._owners is None:
+			self._owners = {i: desktop for desktop in self._desktops.values() for i in desktop.node_data}
+		desktop = self._owners.get(node_id)
+		return desktop.get_node(node_id) if desktop is not None else None
@@ -0,0 +1,199 @@
+import os
+import re
+import socket
+from collections import Counter
+from json import loads
+from logging import error
+from typing import Iterable, List, Optional, Tuple
+
+SOCKET_ENV = "BSPWM_SOCKET"
+SOCKET_PATH_TPL = "/tmp/bspwm{host}_{display}_{screen}-socket"
+FAILURE_MESSAGE = b"\x07"
+DISPLAY_PATTERN = re.compile(r"^(?P<host>[^:]*):(?P<display>\d+)(?:\.(?P<screen>\d+))?$")
+
+
+def socket_path():
+	"""
+	Resolve the socket bspwm is listening on, the same way bspc does
+	"""
+	path = os.getenv(SOCKET_ENV)
+	if path:
+		return path
+	match = DISPLAY_PATTERN.match(os.getenv("DISPLAY", ":0"))
+	if match is None:
+		return SOCKET_PATH_TPL.format(host="", display=0, screen=0)
+	return SOCKET_PATH_TPL.format(host=match["host"], display=int(match["display"]),
+								  screen=int(match["screen"] or 0))
+
+
+class MessageTooLong(ValueError):
+	pass
+
+
+class Reply:
+	"""
+	The response to a single message sent over the bspwm socket.
+	Exposes the same interface as `Process`, so callers don't need to know which transport was used
+	"""
+
+	def __init__(self, sock: socket.socket):
+		self.socket = sock
+		self.stream = sock.makefile('rb')
+		self._output: Optional[bytes] = None
+		self._error: Optional[bytes] = None
+		self._failed = False
+
+	def _receive(self):
+		if self._output is None:
+			response = self.stream.read()
+			self.close()
+			# bspwm reports many failures with the failure byte alone, so the message may well be empty
+			self._failed = response.startswith(FAILURE_MESSAGE)
+			if self._failed:
+				self._output, self._error = b"", response[len(FAILURE_MESSAGE):]
+			else:
+				self._output, self._error = response, b""
+
+	@property
+	def failed(self):
+		self._receive()
+		return self._failed
+
+	def read(self):
+		self._receive()
+		return self._output.strip().decode('utf-8')
+
+	def json(self):
+		return loads(self.read())
+
+	def readline(self):
+		line = self.stream.readline()
+		if line.startswith(FAILURE_MESSAGE):
+			error(line[len(FAILURE_MESSAGE):].strip().decode('utf-8'))
+			return ""
+		return line.strip().decode('utf-8')
+
+	def fileno(self):
+		return self.socket.fileno()
+
+	def wait(self, timeout=None):
+		if timeout is not None:
+			self.socket.settimeout(timeout)
+		self._receive()
+		if self._failed:
+			error(self.error() or "bspwm reported a failure without a message")
+
+	def error(self) -> Optional[str]:
+		"""
+		What bspwm said went wrong, which may be empty, or None if the message didn't fail
+		"""
+		self._receive()
+		if not self._failed:
+			return None
+		return self._error.strip().decode('utf-8')
+
+	def close(self):
+		self.stream.close()
+		self.socket.close()
+
+
+class Connection:
+	"""
+	Talks to bspwm over its unix socket instead of forking `bspc`.
+
+	bspwm closes the client socket once it has replied, so every message needs a fresh connection;
+	subscriptions are the exception and stay open for as long as the reply is read from.
+	"""
+
+	# bspwm reads a message with a single recv into a BUFSIZ buffer, and silently cuts off anything longer
+	MESSAGE_SIZE = 8192 - 1
+	# The messages that fetch JSON state, by domain
+	TREE_FLAGS = {"wm": {"-d", "--dump-state"}, "query": {"-T", "--tree"}}
+
+	def __init__(self, path: str = None):
+		self._path = path
+		# Messages sent by domain, and how many of them fetched JSON state (the whole tree, or part of it)
+		self.sent = Counter()
+		self.trees = Counter()
+
+	@property
+	def path(self):
+		if self._path is None:
+			self._path = socket_path()
+		return self._path
+
+	def connect(self) -> Optional[socket.socket]:
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			sock.connect(self.path)
+		except OSError:
+			sock.close()
+			return None
+		return sock
+
+	def count(self, args: List[str]):
+		if not args:
+			return
+		self.sent[args[0]] += 1
+		if not self.TREE_FLAGS.get(args[0], set()).isdisjoint(args):
+			self.trees["full" if args[0] == "wm" else "partial"] += 1
+
+	def snapshot(self) -> Tuple[Counter, Counter]:
+		return self.sent.copy(), self.trees.copy()
+
+	def since(self, snapshot: Tuple[Counter, Counter]) -> Tuple[Counter, Counter]:
+		"""
+		The messages sent and the trees fetched since `snapshot` was taken
+		"""
+		sent, trees = snapshot
+		return self.sent - sent, self.trees - trees
+
+	@staticmethod
+	def encode(args: Iterable[str]) -> bytes:
+		return b"".join(arg.encode('utf-8') + b"\0" for arg in args)
+
+	@staticmethod
+	def size(args: Iterable[str]) -> int:
+		return sum(len(arg.encode('utf-8')) + 1 for arg in args)
+
+	def fits(self, args: Iterable[str]) -> bool:
+		"""
+		Whether bspwm would read the whole message
+		"""
+		return self.size(args) <= self.MESSAGE_SIZE
+
+	def check(self, message: bytes):
+		if len(message) > self.MESSAGE_SIZE:
+			raise MessageTooLong(f"A {len(message)} byte message is more than bspwm reads ({self.MESSAGE_SIZE} bytes)")
+
+	def send(self, args: Iterable[str]) -> Optional[Reply]:
+		"""
+		Send a message (the arguments that would follow `bspc`) and return its reply,
+		or None if bspwm can't be reached. Raises `MessageTooLong` rather than have bspwm cut it short
+		"""
+		args = list(args)
+		message = self.encode(args)
+		self.check(message)
+		sock = self.connect()
+		if sock is None:
+			return None
+		self.count(args)
+		sock.sendall(message)
+		# Marks the end of the message, so it can be read in full however long it is
+		sock.shutdown(socket.SHUT_WR)
+		return Reply(sock)
+
+	def send_many(self, messages: Iterable[Iterable[str]]) -> List[Optional[Reply]]:
+		"""
+		Pipeline several messages: all of them are sent before any reply is read.
+		bspwm accepts connections in order, so they are still executed in order.
+		If bspwm stops being reachable, the remaining messages get None instead of a reply
+		"""
+		replies = []
+		for args in messages:
+			reply = self.send(args) if not replies or replies[-1] is not None else None
+			replies.append(reply)
+		return replies
+
+
+CONNECTION = Connection()
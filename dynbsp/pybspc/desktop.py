@@ -1,7 +1,8 @@
-from typing import Set, TYPE_CHECKING
+from typing import Dict, FrozenSet, Iterator, Optional, Tuple, TYPE_CHECKING
 
 from .node import Node
-from .utils import run, _int
+from .query import Query
+from .utils import command, _int
 
 if TYPE_CHECKING:
 	from .monitor import Monitor
@@ -12,10 +13,35 @@ class DesktopNotFound(Exception):
 
 
 class Desktop:
+	"""
+	Wraps a desktop. Its node tree stays raw JSON until nodes are asked for, and only the ones
+	reached are wrapped
+	"""
+
 	def __init__(self, data, monitor: "Monitor"):
 		self.data = data
 		self.monitor = monitor
-		self.root = Node.instantiate(self.data["root"], self)
+		self._reset()
+
+	def _reset(self):
+		# Wrapped nodes, by id
+		self._nodes: Dict[int, Node] = {}
+		self._node_data: Optional[Dict[int, Tuple[dict, Optional[dict]]]] = None
+		self._node_set: Optional[FrozenSet[Node]] = None
+		self._windows: Optional[Tuple[Node, ...]] = None
+
+	@property
+	def wm(self):
+		return self.monitor.wm if self.monitor is not None else None
+
+	def update(self, data):
+		wm = self.wm
+		if wm is not None:
+			wm._forget(self)
+		self.data = data
+		self._reset()
+		if wm is not None:
+			wm._index(self)
 
 	@property
 	def id(self):
@@ -25,13 +51,71 @@ class Desktop:
 	def name(self):
 		return self.data["name"]
 
+	@name.setter
+	def name(self, name: str):
+		old_name = self.data["name"]
+		self.data["name"] = name
+		wm = self.wm
+		if wm is not None:
+			wm._rename(self, old_name)
+
 	@property
-	def nodes(self) -> Set[Node]:
-		return {self.root}.union(self.root.children) if self.root is not None else set()
+	def node_data(self) -> Dict[int, Tuple[dict, Optional[dict]]]:
+		"""
+		Every node's raw data and its parent's, by id and in pre-order. Built on first use without wrapping anything
+		"""
+		if self._node_data is None:
+			index = {}
+			stack = [(self.data["root"], None)]
+			while stack:
+				data, parent = stack.pop()
+				if data is None:
+					continue
+				index[data["id"]] = (data, parent)
+				stack.append((data["secondChild"], data))
+				stack.append((data["firstChild"], data))
+			self._node_data = index
+		return self._node_data
+
+	def _wrap(self, data, parent: Node = None) -> Optional[Node]:
+		if data is None:
+			return None
+		node = self._nodes.get(data["id"])
+		if node is None:
+			node = Node(data, self, parent)
+		return node
+
+	def _parent_of(self, node_id) -> Optional[Node]:
+		entry = self.node_data.get(node_id)
+		return self._wrap(entry[1]) if entry is not None else None
+
+	@property
+	def root(self) -> Optional[Node]:
+		return self._wrap(self.data["root"])
+
+	@property
+	def nodes(self) -> FrozenSet[Node]:
+		if self._node_set is None:
+			self._node_set = frozenset(self._wrap(data) for data, _ in self.node_data.values())
+		return self._node_set
+
+	@property
+	def windows(self) -> Tuple[Node, ...]:
+		"""
+		The nodes holding a client, in pre-order
+		"""
+		if self._windows is None:
+			self._windows = tuple(self._wrap(data) for data, _ in self.node_data.values()
+								  if data["client"] is not None)
+		return self._windows
+
+	def walk(self) -> Iterator[Tuple[Node, int]]:
+		root = self.root
+		return root.walk() if root is not None else iter(())
 
 	def get_node(self, node_id):
-		node_id = _int(node_id)
-		return next((node for node in self.nodes if node.id == node_id), None)
+		entry = self.node_data.get(_int(node_id))
+		return self._wrap(entry[0]) if entry is not None else None
 
 	@property
 	def current_node(self):
@@ -43,25 +127,34 @@ class Desktop:
 
 	def pretty_print(self, indent=0):
 		print("|\t" * indent, f"<Desktop id: {self.id}, name: {self.name}, root: ", sep="")
-		if self.root:
-			self.root.pretty_print(indent=indent + 1)
+		root = self.root
+		if root:
+			root.pretty_print(indent=indent + 1)
 		print("|\t" * indent, ">", sep="")
 
 	def rename(self, name: str):
-		removed_spaces = name.replace(" ", "\S")
-		run(f'bspc desktop {self.id} --rename {removed_spaces}')
-		self.data['name'] = name
+		operation = command("desktop", self.id, "--rename", name)
+		self.name = name
+		return operation
 
 	def delete(self):
-		run(f'bspc desktop {self.id} --remove')
+		return command("desktop", self.id, "--remove")
 
 	def swap(self, desktop, follow=False):
-		run(f'bspc desktop {self.id} --swap {desktop.id} {"--follow" if follow else ""}')
+		return command("desktop", self.id, "--swap", desktop.id, *(["--follow"] if follow else []))
 
 	def to_monitor(self, monitor: "Monitor", follow=False):
-		run(f'bspc desktop {self.id} --to-monitor {monitor.id} {"--follow" if follow else ""}')
+		return command("desktop", self.id, "--to-monitor", monitor.id, *(["--follow"] if follow else []))
+
+	def move_nodes(self, desktop: "Desktop", follow=False):
+		"""
+		Move the whole tree to another desktop, in one command
+		"""
+		return command("node", f"@{self.id}:/", "--to-desktop", desktop.id, *(["--follow"] if follow else []))
 
 	@staticmethod
 	def get(selector):
-		proc = run(f"bspc query --desktop {selector} --tree")
-		return Desktop(proc.json(), None)
+		data = Query.desktops().desktop(selector).tree()
+		if data is None:
+			raise DesktopNotFound(selector)
+		return Desktop(data, None)
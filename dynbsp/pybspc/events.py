@@ -0,0 +1,306 @@
+"""
+Typed bspwm events, parsed from the lines `bspc subscribe` reports.
+
+Each event type is a dataclass registered under the name bspwm reports it as. Fields are filled
+from the space-separated arguments in order, ids are parsed as integers, and the last field takes
+whatever is left of the line, since names may contain spaces.
+"""
+from dataclasses import dataclass, fields
+from typing import Callable, ClassVar, Dict, Optional, Tuple, Type
+
+from .utils import _int
+
+EVENTS: Dict[str, Type["Event"]] = {}
+
+
+class Event:
+	__slots__ = ()
+	NAME: ClassVar[str] = ""
+	CONVERTERS: ClassVar[Tuple[Callable, ...]] = ()
+
+	@classmethod
+	def parse(cls, arguments: str) -> Optional["Event"]:
+		converters = cls.CONVERTERS
+		values = arguments.split(" ", len(converters) - 1) if converters else []
+		if len(values) < len(converters) and converters[-1] is str:
+			# A trailing empty name, with the space before it stripped off the line
+			values.append("")
+		if len(values) != len(converters):
+			return None
+		return cls(*(convert(value) for convert, value in zip(converters, values)))
+
+	def arguments(self, wm) -> tuple:
+		"""
+		The arguments a handler registered for this event is called with
+		"""
+		return wm, self
+
+
+def event(name: str):
+	def decorator(cls):
+		cls = dataclass(cls)
+		cls.NAME = name
+		cls.CONVERTERS = tuple(_int if field.type is int else str for field in fields(cls))
+		EVENTS[name] = cls
+		return cls
+
+	return decorator
+
+
+def _node(wm, desktop, node_id):
+	# Looking the node up on its own desktop leaves the rest of the tree unwrapped
+	return desktop.get_node(node_id) if desktop is not None else wm.get_node(node_id)
+
+
+def parse_event(message: str) -> Optional[Event]:
+	"""
+	Parse a line from `bspc subscribe`, or return None if it isn't an event this module knows about
+	"""
+	name, _, arguments = message.partition(" ")
+	cls = EVENTS.get(name)
+	if cls is None:
+		return None
+	try:
+		return cls.parse(arguments)
+	except ValueError:
+		return None
+
+
+@event("monitor_add")
+class MonitorAdd(Event):
+	__slots__ = ("monitor_id", "monitor_name", "geometry")
+	monitor_id: int
+	monitor_name: str
+	geometry: str
+
+	def arguments(self, wm):
+		return wm, wm.get_monitor(self.monitor_id)
+
+
+@event("monitor_rename")
+class MonitorRename(Event):
+	__slots__ = ("monitor_id", "old_name", "new_name")
+	monitor_id: int
+	old_name: str
+	new_name: str
+
+
+@event("monitor_remove")
+class MonitorRemove(Event):
+	__slots__ = ("monitor_id",)
+	monitor_id: int
+
+
+@event("monitor_swap")
+class MonitorSwap(Event):
+	__slots__ = ("src_monitor_id", "dst_monitor_id")
+	src_monitor_id: int
+	dst_monitor_id: int
+
+
+@event("monitor_focus")
+class MonitorFocus(Event):
+	__slots__ = ("monitor_id",)
+	monitor_id: int
+
+
+@event("monitor_geometry")
+class MonitorGeometry(Event):
+	__slots__ = ("monitor_id", "geometry")
+	monitor_id: int
+	geometry: str
+
+
+@event("desktop_add")
+class DesktopAdd(Event):
+	__slots__ = ("monitor_id", "desktop_id", "desktop_name")
+	monitor_id: int
+	desktop_id: int
+	desktop_name: str
+
+
+@event("desktop_rename")
+class DesktopRename(Event):
+	# bspwm reports "<old_name> <new_name>", which can't be split when the names contain spaces
+	__slots__ = ("monitor_id", "desktop_id", "names")
+	monitor_id: int
+	desktop_id: int
+	names: str
+
+
+@event("desktop_remove")
+class DesktopRemove(Event):
+	__slots__ = ("monitor_id", "desktop_id")
+	monitor_id: int
+	desktop_id: int
+
+	def arguments(self, wm):
+		return wm, wm.get_monitor(self.monitor_id), wm.get_desktop(self.desktop_id)
+
+
+@event("desktop_swap")
+class DesktopSwap(Event):
+	__slots__ = ("src_monitor_id", "src_desktop_id", "dst_monitor_id", "dst_desktop_id")
+	src_monitor_id: int
+	src_desktop_id: int
+	dst_monitor_id: int
+	dst_desktop_id: int
+
+
+@event("desktop_transfer")
+class DesktopTransfer(Event):
+	__slots__ = ("src_monitor_id", "desktop_id", "dst_monitor_id")
+	src_monitor_id: int
+	desktop_id: int
+	dst_monitor_id: int
+
+	def arguments(self, wm):
+		return (wm, wm.get_monitor(self.src_monitor_id), wm.get_desktop(self.desktop_id),
+				wm.get_monitor(self.dst_monitor_id))
+
+
+@event("desktop_focus")
+class DesktopFocus(Event):
+	__slots__ = ("monitor_id", "desktop_id")
+	monitor_id: int
+	desktop_id: int
+
+
+@event("desktop_activate")
+class DesktopActivate(Event):
+	__slots__ = ("monitor_id", "desktop_id")
+	monitor_id: int
+	desktop_id: int
+
+
+@event("desktop_layout")
+class DesktopLayout(Event):
+	__slots__ = ("monitor_id", "desktop_id", "layout")
+	monitor_id: int
+	desktop_id: int
+	layout: str
+
+
+@event("node_add")
+class NodeAdd(Event):
+	__slots__ = ("monitor_id", "desktop_id", "ip_id", "node_id")
+	monitor_id: int
+	desktop_id: int
+	ip_id: int
+	node_id: int
+
+	def arguments(self, wm):
+		desktop = wm.get_desktop(self.desktop_id)
+		return wm, wm.get_monitor(self.monitor_id), desktop, _node(wm, desktop, self.node_id)
+
+
+@event("node_remove")
+class NodeRemove(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+
+	def arguments(self, wm):
+		desktop = wm.get_desktop(self.desktop_id)
+		return wm, wm.get_monitor(self.monitor_id), desktop, _node(wm, desktop, self.node_id)
+
+
+@event("node_swap")
+class NodeSwap(Event):
+	__slots__ = ("src_monitor_id", "src_desktop_id", "src_node_id", "dst_monitor_id", "dst_desktop_id",
+				 "dst_node_id")
+	src_monitor_id: int
+	src_desktop_id: int
+	src_node_id: int
+	dst_monitor_id: int
+	dst_desktop_id: int
+	dst_node_id: int
+
+	def arguments(self, wm):
+		src_desktop, dst_desktop = wm.get_desktop(self.src_desktop_id), wm.get_desktop(self.dst_desktop_id)
+		return (wm, wm.get_monitor(self.src_monitor_id), src_desktop, _node(wm, src_desktop, self.src_node_id),
+				wm.get_monitor(self.dst_monitor_id), dst_desktop, _node(wm, dst_desktop, self.dst_node_id))
+
+
+@event("node_transfer")
+class NodeTransfer(NodeSwap):
+	__slots__ = ()
+
+
+@event("node_focus")
+class NodeFocus(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+
+
+@event("node_activate")
+class NodeActivate(NodeFocus):
+	__slots__ = ()
+
+
+@event("node_presel")
+class NodePresel(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "presel")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	presel: str
+
+
+@event("node_stack")
+class NodeStack(Event):
+	__slots__ = ("node_id", "stack", "relative_node_id")
+	node_id: int
+	stack: str
+	relative_node_id: int
+
+
+@event("node_geometry")
+class NodeGeometry(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "geometry")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	geometry: str
+
+
+@event("node_state")
+class NodeState(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "state", "value")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	state: str
+	value: str
+
+
+@event("node_flag")
+class NodeFlagChange(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "flag", "value")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	flag: str
+	value: str
+
+
+@event("node_layer")
+class NodeLayer(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "layer")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	layer: str
+
+
+@event("pointer_action")
+class PointerAction(Event):
+	__slots__ = ("monitor_id", "desktop_id", "node_id", "action", "action_state")
+	monitor_id: int
+	desktop_id: int
+	node_id: int
+	action: str
+	action_state: str
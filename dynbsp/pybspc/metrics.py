@@ -0,0 +1,153 @@
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+
+class Histogram:
+	"""
+	Latencies bucketed on a fixed log scale, so recording one is O(log buckets) and memory doesn't grow
+	"""
+
+	BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+	def __init__(self):
+		self.buckets: List[int] = [0] * (len(self.BOUNDS_MS) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def observe(self, seconds: float):
+		ms = seconds * 1000
+		self.buckets[bisect_left(self.BOUNDS_MS, ms)] += 1
+		self.count += 1
+		self.total += ms
+		self.max = max(self.max, ms)
+
+	def percentile(self, fraction: float) -> Optional[float]:
+		"""
+		The upper bound of the bucket holding the given fraction of observations, capped at the slowest one
+		"""
+		if not self.count:
+			return None
+		rank = fraction * self.count
+		seen = 0
+		for bound, count in zip(self.BOUNDS_MS, self.buckets):
+			seen += count
+			if seen >= rank:
+				return min(bound, self.max)
+		return self.max
+
+	def to_dict(self):
+		return {
+			"count": self.count,
+			"mean_ms": self.total / self.count if self.count else None,
+			"p50_ms": self.percentile(0.5),
+			"p95_ms": self.percentile(0.95),
+			"p99_ms": self.percentile(0.99),
+			"max_ms": self.max,
+			"buckets": {str(bound): count for bound, count in zip(self.BOUNDS_MS + ("inf",), self.buckets) if count},
+		}
+
+
+class Traffic:
+	"""
+	The bspc commands, by domain, and the tree fetches, full or partial, that something caused
+	"""
+
+	def __init__(self):
+		self.commands = Counter()
+		self.trees = Counter()
+
+	def add(self, commands: Counter, trees: Counter):
+		self.commands.update(commands)
+		self.trees.update(trees)
+
+	def to_dict(self):
+		return {"commands": dict(sorted(self.commands.items())), "tree_fetches": dict(sorted(self.trees.items()))}
+
+
+class Metrics:
+	"""
+	What a `Subscriber` has been doing: how long each event type and each handler took, the bspc traffic
+	each of them caused, and how far behind bspwm it has fallen
+	"""
+
+	def __init__(self):
+		self.events: Dict[str, Histogram] = {}
+		self.handlers: Dict[str, Histogram] = {}
+		self.event_traffic: Dict[str, Traffic] = {}
+		self.handler_traffic: Dict[str, Traffic] = {}
+		self.lag = 0
+		self.max_lag = 0
+		self.lag_bytes = 0
+		self.max_lag_bytes = 0
+
+	@staticmethod
+	def _observe(histograms: Dict[str, Histogram], traffic: Dict[str, Traffic], name: str, seconds: float,
+				 sent: Tuple[Counter, Counter] = None):
+		histogram = histograms.get(name)
+		if histogram is None:
+			histogram = histograms[name] = Histogram()
+			traffic[name] = Traffic()
+		histogram.observe(seconds)
+		if sent is not None:
+			traffic[name].add(*sent)
+
+	def observe_event(self, name: str, seconds: float, sent: Tuple[Counter, Counter] = None):
+		"""
+		:param sent: the commands and tree fetches handling the event caused (see `Connection.since`)
+		"""
+		self._observe(self.events, self.event_traffic, name, seconds, sent)
+
+	def observe_handler(self, name: str, seconds: float, sent: Tuple[Counter, Counter] = None):
+		self._observe(self.handlers, self.handler_traffic, name, seconds, sent)
+
+	def observe_lag(self, events: int, unread: int):
+		"""
+		:param events: events read but not handled yet
+		:param unread: bytes bspwm has sent that haven't been read
+		"""
+		self.lag, self.lag_bytes = events, unread
+		self.max_lag = max(self.max_lag, events)
+		self.max_lag_bytes = max(self.max_lag_bytes, unread)
+
+	def to_dict(self, sent: Counter = None, trees: Counter = None):
+		return {
+			"events": {name: {**histogram.to_dict(), **self.event_traffic[name].to_dict()}
+					   for name, histogram in sorted(self.events.items())},
+			"handlers": {name: {**histogram.to_dict(), **self.handler_traffic[name].to_dict()}
+						 for name, histogram in sorted(self.handlers.items())},
+			"lag": {"events": self.lag, "max_events": self.max_lag, "bytes": self.lag_bytes,
+					"max_bytes": self.max_lag_bytes},
+			"commands": dict(sorted((sent or {}).items())),
+			"tree_fetches": dict(sorted((trees or {}).items())),
+		}
+
+
+def format_stats(stats: dict) -> str:
+	"""
+	Render what `Metrics.to_dict` returned as a table
+	"""
+
+	def ms(value):
+		return "-" if value is None else f"{value:.2f}"
+
+	def total(counts):
+		return sum(counts.values()) if counts is not None else "-"
+
+	lines = []
+	for section in ("events", "handlers"):
+		lines.append(f"{section:<24}{'count':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)"
+					 f"{'bspc':>8}{'trees':>7}")
+		for name, histogram in stats[section].items():
+			lines.append(f"  {name:<22}{histogram['count']:>8}" + "".join(
+				f"{ms(histogram[key]):>9}" for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")) +
+						 f"{'':6}{total(histogram.get('commands')):>8}{total(histogram.get('tree_fetches')):>7}")
+		lines.append("")
+	lag = stats["lag"]
+	lines.append(f"lag: {lag['events']} events (max {lag['max_events']}), "
+				 f"{lag['bytes']} bytes unread (max {lag['max_bytes']})")
+	for label, key in (("bspc commands", "commands"), ("tree fetches", "tree_fetches")):
+		counts = ", ".join(f"{name} {count}" for name, count in stats[key].items()) or "none"
+		lines.append(f"{label}: {counts}")
+	return "\n".join(lines)
@@ -1,16 +1,52 @@
-from typing import Set, List, Tuple
+from logging import debug
+from typing import Dict, Set, List, Optional, Tuple, TYPE_CHECKING
 
+from .connection import CONNECTION
 from .desktop import Desktop
 from .node import Node
-from .utils import run, INVCHAR, _int, Rect, Padding
+from .query import Query
+from .utils import command, execute, cached, _int, Rect, Padding, Transaction
+
+if TYPE_CHECKING:
+	from .bspwm import BSPWM
 
 
 class Monitor:
-	def __init__(self, data):
+	# Whether the running bspwm understands `monitor --reorder-desktops`, None until it's been tried
+	REORDER_DESKTOPS: Optional[bool] = None
+
+	def __init__(self, data, wm: "BSPWM" = None):
 		self.data = data
-		self.desktops = []
+		self.wm = wm
+		self.desktops: List[Desktop] = []
+		self._desktops: Dict[int, Desktop] = {}
+		self._cache: Dict[str, tuple] = {}
 		for desktop in data["desktops"]:
-			self.desktops.append(Desktop(desktop, self))
+			self.add_desktop(Desktop(desktop, self))
+
+	def add_desktop(self, desktop: Desktop):
+		desktop.monitor = self
+		self.desktops.append(desktop)
+		self._desktops[desktop.id] = desktop
+		if self.wm is not None:
+			self.wm._index(desktop)
+
+	def remove_desktop(self, desktop: Desktop):
+		self.desktops.remove(desktop)
+		del self._desktops[desktop.id]
+		if self.wm is not None:
+			self.wm._forget(desktop)
+
+	def replace_desktop(self, index: int, desktop: Desktop):
+		"""
+		Put an already indexed desktop at `index`, as happens when bspwm swaps two desktops
+		"""
+		previous = self.desktops[index]
+		if self._desktops.get(previous.id) is previous:
+			del self._desktops[previous.id]
+		desktop.monitor = self
+		self.desktops[index] = desktop
+		self._desktops[desktop.id] = desktop
 
 	@property
 	def id(self):
@@ -20,6 +56,13 @@ class Monitor:
 	def name(self):
 		return self.data["name"]
 
+	@property
+	def wired(self) -> bool:
+		"""
+		False once the output has been unplugged, if bspwm is set to keep unplugged monitors
+		"""
+		return self.data.get("wired", True)
+
 	@property
 	def current_desktop(self):
 		desktop_id = self.data["focusedDesktopId"]
@@ -27,14 +70,41 @@ class Monitor:
 
 	@property
 	def nodes(self) -> Set[Node]:
-		return set().union(*(d.nodes for d in self.desktops))
-
-	def create_desktop(self, name: str):
-		temp_name = INVCHAR
-		run(f'bspc monitor {self.id} --add-desktops {temp_name}')
-		desktop = Desktop.get(temp_name)
-		desktop.rename(name)
-		return desktop
+		return {node for desktop in self.desktops for node in desktop.nodes}
+
+	def create_desktop(self, name: str) -> Desktop:
+		return self.create_desktops([name])[0]
+
+	def create_desktops(self, names: List[str]) -> List[Desktop]:
+		"""
+		Add desktops with their final names, in as few commands as bspwm reads in full. A running `State`
+		learns their ids from the `desktop_add` events that follow; otherwise they're the monitor's last desktops
+		"""
+		from .state import State
+
+		if not names:
+			return []
+		existing = set(self._desktops)
+		for chunk in self._add_desktops_chunks(names):
+			execute(["bspc", *chunk])
+		live = State.live
+		if live is not None and live.wm is self.wm:
+			live.sync()
+			added = [desktop for desktop in self.desktops if desktop.id not in existing]
+			if len(added) == len(names):
+				return added
+		data = Query.monitors().monitor(self).tree()
+		added = [desktop for desktop in (data["desktops"] if data is not None else []) if desktop["id"] not in existing]
+		return [Desktop(desktop, None) for desktop in added[-len(names):]]
+
+	def _add_desktops_chunks(self, names: List[str]) -> List[List[str]]:
+		prefix = ["monitor", str(self.id), "--add-desktops"]
+		chunks = [prefix.copy()]
+		for name in names:
+			if len(chunks[-1]) > len(prefix) and not CONNECTION.fits([*chunks[-1], name]):
+				chunks.append(prefix.copy())
+			chunks[-1].append(name)
+		return chunks
 
 	def __repr__(self) -> str:
 		return f"<Monitor id: {self.id}, name: {self.name}>"
@@ -46,39 +116,85 @@ class Monitor:
 		print("|\t" * indent, "]>", sep="")
 
 	def get_desktop(self, desktop_id):
-		desktop_id = _int(desktop_id)
-		return next((desktop for desktop in self.desktops if desktop.id == desktop_id), None)
+		return self._desktops.get(_int(desktop_id))
 
 	def get_node(self, node_id):
 		node_id = _int(node_id)
-		return next((node for node in self.nodes if node.id == node_id), None)
+		return next((desktop.get_node(node_id) for desktop in self.desktops if node_id in desktop.node_data), None)
+
+	def plan_reorder(self, ordered_desktops: List[Desktop]) -> List[Tuple[Desktop, Desktop]]:
+		"""
+		Work out the swaps that put this monitor's desktops in the given order.
+		Each cycle of the permutation costs its length minus one swaps, which is the minimum possible.
+		Desktops that aren't on this monitor are ignored, and any left out keep their relative order at the end
+		"""
+		target: Dict[int, int] = {}
+		for desktop in ordered_desktops:
+			if desktop is not None and desktop.id in self._desktops and desktop.id not in target:
+				target[desktop.id] = len(target)
+		for desktop in self.desktops:
+			if desktop.id not in target:
+				target[desktop.id] = len(target)
 
-	def reorder(self, ordered_desktops: List[Desktop]):
 		operations: List[Tuple[Desktop, Desktop]] = []
 		working = self.desktops.copy()
 		for i in range(len(working)):
-			current_desktop = working[i]
-			target_index = ordered_desktops.index(current_desktop)
-			target_desktop = working[target_index]
-			operations.append((current_desktop, target_desktop))
-			working[i] = target_desktop
-			working[target_index] = current_desktop
+			while target[working[i].id] != i:
+				j = target[working[i].id]
+				operations.append((working[i], working[j]))
+				working[i], working[j] = working[j], working[i]
+		return operations
 
-		for operation in operations:
-			operation[0].swap(operation[1])
+	def reorder(self, ordered_desktops: List[Desktop]):
+		operations = self.plan_reorder(ordered_desktops)
+		if not operations:
+			return
+		if self._reorder_desktops(operations):
+			return
+		with Transaction():
+			for operation in operations:
+				operation[0].swap(operation[1])
+
+	def _reorder_desktops(self, operations: List[Tuple[Desktop, Desktop]]) -> bool:
+		"""
+		Reorder with a single `monitor --reorder-desktops`, where bspwm supports it.
+		The command addresses desktops by name, looking each one up across every monitor and silently skipping
+		those found on another monitor, so it's only used when the names are unique in the whole window manager,
+		and when they fit in one message
+		"""
+		if Monitor.REORDER_DESKTOPS is False or self.wm is None:
+			return False
+		working = self.desktops.copy()
+		position = {desktop.id: i for i, desktop in enumerate(working)}
+		for a, b in operations:
+			i, j = position[a.id], position[b.id]
+			working[i], working[j] = b, a
+			position[a.id], position[b.id] = j, i
+		names = [desktop.name for desktop in working]
+		if "" in names or any(len(self.wm.get_desktops_by_name(name)) != 1 for name in names):
+			return False
+		args = ["monitor", str(self.id), "--reorder-desktops", *names]
+		if not CONNECTION.fits(args):
+			return False
+		reply = execute(["bspc", *args], wait=False)
+		if not reply.failed:
+			Monitor.REORDER_DESKTOPS = True
+			return True
+		if Monitor.REORDER_DESKTOPS is None:
+			debug(f"--reorder-desktops isn't available ({reply.error()}), falling back to swaps")
+			Monitor.REORDER_DESKTOPS = False
+		return False
 
 	def remove(self):
-		run(f'bspc monitor {self.id} --remove')
+		return command("monitor", self.id, "--remove")
 
 	@property
-	def rectangle(self):
-		return Rect(self.data["rectangle"]["x"], self.data["rectangle"]["y"], self.data["rectangle"]["width"],
-					self.data["rectangle"]["height"])
+	def rectangle(self) -> Rect:
+		return cached(self._cache, self.data, "rectangle", Rect.from_dict)
 
 	@property
-	def padding(self):
-		return Padding(self.data["padding"]["top"], self.data["padding"]["right"], self.data["padding"]["bottom"],
-						self.data["padding"]["left"])
+	def padding(self) -> Padding:
+		return cached(self._cache, self.data, "padding", Padding.from_dict)
 
 	@property
 	def window_gap(self):
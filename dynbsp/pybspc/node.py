@@ -1,47 +1,112 @@
 from enum import Enum
-from typing import TYPE_CHECKING, Union
+from logging import debug
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterator, Optional, Tuple
 
-from .utils import run, Rect
+from .query import Query
+from .utils import command, cached, Rect
 
 if TYPE_CHECKING:
 	from .desktop import Desktop
 
 
 class Node:
-	def __init__(self, data, desktop: Union["Desktop", "Node"]):
+	"""
+	Wraps one node of a desktop's tree. Children, parent and client are only wrapped when accessed
+	"""
+
+	def __init__(self, data, desktop: "Desktop", parent: "Node" = None):
 		self.data = data
 		self.desktop = desktop
-		self.client = Client(data["client"]) if data["client"] is not None else None
-		self.first_child = Node.instantiate(self.data["firstChild"], self)
-		self.second_child = Node.instantiate(self.data["secondChild"], self)
+		self._parent = parent
+		self._client: Optional[Client] = None
+		self._children: Optional[FrozenSet[Node]] = None
+		if desktop is not None:
+			desktop._nodes[self.id] = self
+
+	@property
+	def id(self):
+		return self.data["id"]
 
 	@staticmethod
-	def instantiate(data, desktop: Union["Desktop", "Node"]):
+	def get(selector) -> Optional["Node"]:
+		"""
+		Fetch a node straight from bspwm, detached from any desktop, or None if nothing matches
+		"""
+		data = Query.nodes().node(selector).tree()
+		return Node(data, None) if data is not None else None
+
+	@property
+	def client(self) -> Optional["Client"]:
+		if self._client is None and self.data["client"] is not None:
+			self._client = Client(self.data["client"])
+		return self._client
+
+	@property
+	def parent(self) -> Optional["Node"]:
+		if self._parent is None and self.desktop is not None:
+			self._parent = self.desktop._parent_of(self.id)
+		return self._parent
+
+	def _child(self, key) -> Optional["Node"]:
+		data = self.data[key]
 		if data is None:
 			return None
-		return Node(data, desktop)
+		if self.desktop is not None:
+			return self.desktop._wrap(data, self)
+		return Node(data, None, self)
 
 	@property
-	def id(self):
-		return self.data["id"]
+	def first_child(self) -> Optional["Node"]:
+		return self._child("firstChild")
+
+	@property
+	def second_child(self) -> Optional["Node"]:
+		return self._child("secondChild")
+
+	@property
+	def is_leaf(self):
+		return self.data["firstChild"] is None and self.data["secondChild"] is None
+
+	def walk(self) -> Iterator[Tuple["Node", int]]:
+		"""
+		Iterate over this node and its descendants in pre-order, along with their depth below this node
+		"""
+		stack = [(self, 0)]
+		while stack:
+			node, depth = stack.pop()
+			yield node, depth
+			if node.second_child is not None:
+				stack.append((node.second_child, depth + 1))
+			if node.first_child is not None:
+				stack.append((node.first_child, depth + 1))
+
+	def descendants(self) -> Iterator["Node"]:
+		walk = self.walk()
+		next(walk)
+		return (node for node, _ in walk)
+
+	def leaves(self) -> Iterator["Node"]:
+		return (node for node, _ in self.walk() if node.is_leaf)
+
+	def windows(self) -> Iterator["Node"]:
+		return (node for node, _ in self.walk() if node.client is not None)
+
+	@property
+	def children(self) -> FrozenSet["Node"]:
+		if self._children is None:
+			self._children = frozenset(self.descendants())
+		return self._children
 
 	@property
-	def children(self):
-		children = set()
-		if self.first_child:
-			children.add(self.first_child)
-			children = children.union(self.first_child.children)
-		if self.second_child:
-			children.add(self.second_child)
-			children = children.union(self.second_child.children)
-		return children
+	def monitor(self):
+		return self.desktop.monitor if self.desktop is not None else None
 
 	@property
 	def sticky(self):
 		return self.data["sticky"]
 
 	def to_desktop(self, desktop: "Desktop", follow=True):
-		run(f'bspc node {self.id} --to-desktop {desktop.id} {"--follow" if follow else ""}')
+		return command("node", self.id, "--to-desktop", desktop.id, *(["--follow"] if follow else []))
 
 	def __repr__(self):
 		return f"<Node id: {self.id}, client: {self.client}>"
@@ -59,16 +124,16 @@ class Node:
 			print("|\t" * indent, "]>", sep="")
 
 	def set_state(self, state: "ClientState"):
-		run(f"bspc node {self.id} --state {state.value}")
+		return command("node", self.id, "--state", state.value)
 
 	def set_flag(self, flag: "NodeFlag", enable=True):
-		run(f"bspc node {self.id} --flag {flag.value}={'on' if enable else 'off'}")
+		return command("node", self.id, "--flag", f"{flag.value}={'on' if enable else 'off'}")
 
 	def move(self, dx, dy):
-		run(f'bspc node {self.id} --move {dx} {dy}')
+		return command("node", self.id, "--move", dx, dy)
 
 	def resize(self, dw, dh, handle):
-		run(f'bspc node {self.id} --resize {handle} {dw} {dh}')
+		return command("node", self.id, "--resize", handle, dw, dh)
 
 	def set_rect(self, target: "Rect"):
 		"""
@@ -83,9 +148,8 @@ class Node:
 		dy = target.y - self.client.floating_rectangle.y
 		dw = target.width - self.client.floating_rectangle.width
 		dh = target.height - self.client.floating_rectangle.height
-		print(self.client.floating_rectangle)
-		print(dx, dy, dw, dh)
-		run(f'bspc node {self.id} --move {dx} {dy} --resize bottom_right {dw} {dh}')
+		debug(f"Moving {self} from {self.client.floating_rectangle} by {dx} {dy}, resizing by {dw} {dh}")
+		return command("node", self.id, "--move", dx, dy, "--resize", "bottom_right", dw, dh)
 
 
 class NodeFlag(Enum):
@@ -99,6 +163,7 @@ class NodeFlag(Enum):
 class Client:
 	def __init__(self, data):
 		self.data = data
+		self._cache: Dict[str, tuple] = {}
 
 	@property
 	def class_name(self):
@@ -113,14 +178,12 @@ class Client:
 		return ClientState(self.data["state"])
 
 	@property
-	def tiled_rectangle(self):
-		return Rect(self.data["tiledRectangle"]["x"], self.data["tiledRectangle"]["y"],
-					self.data["tiledRectangle"]["width"], self.data["tiledRectangle"]["height"])
+	def tiled_rectangle(self) -> Rect:
+		return cached(self._cache, self.data, "tiledRectangle", Rect.from_dict)
 
 	@property
-	def floating_rectangle(self):
-		return Rect(self.data["floatingRectangle"]["x"], self.data["floatingRectangle"]["y"],
-					self.data["floatingRectangle"]["width"], self.data["floatingRectangle"]["height"])
+	def floating_rectangle(self) -> Rect:
+		return cached(self._cache, self.data, "floatingRectangle", Rect.from_dict)
 
 	def __repr__(self):
 		return f"<Client class: {self.class_name}>"
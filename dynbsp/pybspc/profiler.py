@@ -0,0 +1,67 @@
+import io
+import os
+import pstats
+from contextlib import contextmanager
+from cProfile import Profile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class HandlerProfiler:
+	"""
+	Profiles a running `Subscriber` on demand, keeping a separate profile for each handler,
+	so a slow `reorder` doesn't get lost among hundreds of cheap `node_added` calls
+	"""
+
+	def __init__(self, top: int = 25):
+		self.top = top
+		self.profiles: Dict[str, Profile] = {}
+		self.started: Optional[datetime] = None
+
+	@property
+	def active(self):
+		return self.started is not None
+
+	def start(self):
+		if not self.active:
+			self.profiles = {}
+			self.started = datetime.now()
+
+	@contextmanager
+	def profile(self, name: str):
+		if not self.active:
+			yield
+			return
+		profile = self.profiles.get(name)
+		if profile is None:
+			profile = self.profiles[name] = Profile()
+		profile.enable()
+		try:
+			yield
+		finally:
+			profile.disable()
+
+	def stop(self, directory: str) -> List[str]:
+		"""
+		Stop profiling, and write a `.cprofile` file per handler plus a text summary of each one's
+		`top` most expensive calls into `directory`. Returns the paths written
+		"""
+		if not self.active:
+			return []
+		prefix = os.path.join(directory, f"dynbsp-{self.started:%Y%m%d-%H%M%S}")
+		profiles, self.profiles, self.started = self.profiles, {}, None
+		os.makedirs(directory, exist_ok=True)
+		paths = []
+		summary = io.StringIO()
+		for name, profile in sorted(profiles.items()):
+			path = f"{prefix}-{name}.cprofile"
+			profile.dump_stats(path)
+			paths.append(path)
+			stats = pstats.Stats(profile, stream=summary)
+			summary.write(f"==== {name}: {stats.total_calls} calls in {stats.total_tt:.3f}s\n")
+			stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+		path = f"{prefix}.txt"
+		with open(path, "w") as f:
+			f.write(summary.getvalue() or "Nothing was handled while profiling\n")
+		paths.append(path)
+		return paths
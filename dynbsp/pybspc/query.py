@@ -0,0 +1,104 @@
+from json import loads
+from typing import Dict, List, Optional
+
+from .utils import execute, _int
+
+DOMAINS = ("monitor", "desktop", "node")
+
+
+def selector(descriptor="", *modifiers: str) -> str:
+	"""
+	Build a bspwm selector: `selector(desktop, "!occupied")` -> `0x00200002.!occupied`.
+	`descriptor` can be anything with an `id`, or a descriptor string such as `focused` or `@^1:/`
+	"""
+	descriptor = str(getattr(descriptor, "id", descriptor))
+	return descriptor + "".join(f".{modifier}" for modifier in modifiers)
+
+
+class Query:
+	"""
+	A `bspc query`, so bspwm does the filtering instead of the whole tree being dumped and searched.
+
+		Query.nodes().node("", "window", "!hidden").ids()                # query -N -n .window.!hidden
+		Query.desktops().monitor(monitor).desktop("", "!occupied").ids()  # query -D -m <id> -d .!occupied
+		Query.desktops().desktop(desktop).tree()                           # query -T -d <id>
+
+	The selector given for the domain being listed filters it; selectors for the other domains restrict
+	where it's looked for.
+	"""
+
+	def __init__(self, domain: str):
+		if domain not in DOMAINS:
+			raise ValueError(f"Can't query {domain}s")
+		self.domain = domain
+		self.selectors: Dict[str, str] = {}
+
+	@staticmethod
+	def monitors():
+		return Query("monitor")
+
+	@staticmethod
+	def desktops():
+		return Query("desktop")
+
+	@staticmethod
+	def nodes():
+		return Query("node")
+
+	def monitor(self, descriptor="", *modifiers: str) -> "Query":
+		self.selectors["monitor"] = selector(descriptor, *modifiers)
+		return self
+
+	def desktop(self, descriptor="", *modifiers: str) -> "Query":
+		self.selectors["desktop"] = selector(descriptor, *modifiers)
+		return self
+
+	def node(self, descriptor="", *modifiers: str) -> "Query":
+		self.selectors["node"] = selector(descriptor, *modifiers)
+		return self
+
+	def where(self, *modifiers: str) -> "Query":
+		"""
+		Add modifiers to the selector of the domain being queried
+		"""
+		current = self.selectors.get(self.domain, "")
+		self.selectors[self.domain] = selector(current, *modifiers)
+		return self
+
+	def arguments(self, *flags: str) -> List[str]:
+		args = ["bspc", "query", *flags]
+		for domain in DOMAINS:
+			if domain in self.selectors:
+				args.extend((f"--{domain}", self.selectors[domain]))
+		return args
+
+	def _lines(self, *flags: str) -> List[str]:
+		# bspwm fails the query when nothing matches
+		reply = execute(self.arguments(f"--{self.domain}s", *flags), wait=False)
+		output = reply.read()
+		if reply.failed:
+			return []
+		return [line for line in output.splitlines() if line]
+
+	def ids(self) -> List[int]:
+		return [_int(line) for line in self._lines()]
+
+	def names(self) -> List[str]:
+		return self._lines("--names")
+
+	def first(self) -> Optional[int]:
+		ids = self.ids()
+		return ids[0] if ids else None
+
+	def tree_arguments(self) -> List[str]:
+		return ["bspc", "query", "--tree", f"--{self.domain}", self.selectors.get(self.domain, "focused")]
+
+	def tree(self) -> Optional[dict]:
+		"""
+		The JSON of the first match only, rather than of the whole window manager
+		"""
+		reply = execute(self.tree_arguments(), wait=False)
+		output = reply.read()
+		if reply.failed or not output:
+			return None
+		return loads(output)
@@ -0,0 +1,269 @@
+import fcntl
+import os
+import struct
+import termios
+from collections import deque
+from logging import debug, warning
+from select import select
+from typing import Deque, Optional, FrozenSet
+
+from . import events
+from .events import Event, parse_event
+
+from .bspwm import BSPWM
+from .desktop import Desktop
+from .monitor import Monitor
+from .node import ClientState
+from .query import Query
+from .utils import Rect
+
+
+class State:
+	"""
+	A long-lived mirror of the bspwm tree.
+
+	The tree is fetched once, then kept up to date from the events read off a `bspc subscribe` stream.
+	Events that only change names, order or focus are applied in place; events that change the node
+	tree of a desktop refetch just that desktop. Anything that can't be applied triggers a full resync.
+
+	Only `EVENTS` need to be subscribed to for the tree to stay correct. Node focus and geometry are
+	applied when they're reported, but aren't subscribed to for their own sake: they arrive in storms,
+	and otherwise only get refreshed when the desktop holding the node is refetched.
+	"""
+
+	live: Optional["State"] = None
+	EVENTS: FrozenSet[str] = frozenset((
+		"monitor_add", "monitor_rename", "monitor_remove", "monitor_swap", "monitor_focus", "monitor_geometry",
+		"desktop_add", "desktop_rename", "desktop_remove", "desktop_swap", "desktop_transfer", "desktop_focus",
+		"desktop_activate", "desktop_layout",
+		"node_add", "node_remove", "node_swap", "node_transfer", "node_state", "node_flag",
+	))
+
+	def __init__(self, subscription, wm: BSPWM = None):
+		self.subscription = subscription
+		self.pending: Deque[Event] = deque()
+		self.actions = {name: getattr(self, f"_{name}") for name in events.EVENTS if hasattr(self, f"_{name}")}
+		self._buffer = b""
+		self.wm = wm if wm is not None else BSPWM.get()
+
+	def activate(self):
+		State.live = self
+
+	def fileno(self):
+		return self.subscription.fileno()
+
+	def unread(self) -> int:
+		"""
+		How many bytes of events bspwm has sent that haven't been handed out yet
+		"""
+		try:
+			waiting = struct.unpack("i", fcntl.ioctl(self.fileno(), termios.FIONREAD, b"\0" * 4))[0]
+		except (OSError, AttributeError):
+			waiting = 0
+		return waiting + len(self._buffer)
+
+	def resubscribe(self, subscription):
+		"""
+		Switch to a new subscription. Events may have been missed in between, so the tree is refetched
+		"""
+		self.subscription = subscription
+		self._buffer = b""
+		self.resync()
+
+	def read(self, timeout=None) -> bool:
+		"""
+		Read and apply whatever events are available, waiting up to `timeout` seconds for some to arrive
+		"""
+		if timeout is not None and not select([self], [], [], timeout)[0]:
+			return False
+		chunk = os.read(self.fileno(), 65536)
+		if not chunk:
+			raise EOFError("bspwm subscription closed")
+		*lines, self._buffer = (self._buffer + chunk).split(b"\n")
+		for line in lines:
+			try:
+				event = parse_event(line.strip().decode('utf-8'))
+			except UnicodeDecodeError:
+				continue
+			if event is not None:
+				self.feed(event)
+		return True
+
+	def feed(self, event: Event):
+		"""
+		Apply an event and queue it to be handed out by `poll`
+		"""
+		self.apply(event)
+		self.pending.append(event)
+
+	def poll(self) -> Event:
+		"""
+		Return the next event that hasn't been handed out yet, blocking until one arrives
+		"""
+		while not self.pending:
+			self.read()
+		return self.pending.popleft()
+
+	def sync(self) -> BSPWM:
+		"""
+		Apply every event bspwm has already sent, so the mirror reflects any commands issued so far
+		"""
+		while self.read(timeout=0):
+			pass
+		return self.wm
+
+	def resync(self):
+		debug("Resyncing bspwm state")
+		self.wm = BSPWM.get()
+
+	def apply(self, event: Event):
+		action = self.actions.get(event.NAME)
+		if action is None:
+			return
+		try:
+			if action(event) is False:
+				self.resync()
+		except Exception as e:
+			warning(f"Couldn't apply {event} ({e!r}), resyncing")
+			self.resync()
+
+	def tree(self, query: Query) -> Optional[dict]:
+		"""
+		Fetch part of the tree. Every refetch the events cause goes through here
+		"""
+		return query.tree()
+
+	def _fetch_desktop(self, desktop_id) -> bool:
+		desktop = self.wm.get_desktop(desktop_id)
+		if desktop is None:
+			return False
+		data = self.tree(Query.desktops().desktop(desktop))
+		if data is None:
+			return False
+		desktop.update(data)
+		return True
+
+	def _fetch_monitor(self, monitor_id) -> Optional[Monitor]:
+		data = self.tree(Query.monitors().monitor(monitor_id))
+		return Monitor(data) if data is not None else None
+
+	def _focus(self, monitor_id, desktop_id=None, node_id=None):
+		self.wm.data["focusedMonitorId"] = monitor_id
+		if desktop_id is not None:
+			monitor = self.wm.get_monitor(monitor_id)
+			monitor.data["focusedDesktopId"] = desktop_id
+			if node_id is not None:
+				monitor.get_desktop(desktop_id).data["focusedNodeId"] = node_id
+
+	def _monitor_add(self, event: events.MonitorAdd):
+		monitor = self._fetch_monitor(event.monitor_id)
+		if monitor is None:
+			return False
+		existing = self.wm.get_monitor(event.monitor_id)
+		if existing is not None:
+			self.wm.remove_monitor(existing)
+		self.wm.add_monitor(monitor)
+
+	def _monitor_rename(self, event: events.MonitorRename):
+		self.wm.get_monitor(event.monitor_id).data["name"] = event.new_name
+
+	def _monitor_remove(self, event: events.MonitorRemove):
+		monitor = self.wm.get_monitor(event.monitor_id)
+		if monitor is not None:
+			self.wm.remove_monitor(monitor)
+
+	def _monitor_swap(self, event: events.MonitorSwap):
+		pass
+
+	def _monitor_focus(self, event: events.MonitorFocus):
+		self._focus(event.monitor_id)
+
+	def _monitor_geometry(self, event: events.MonitorGeometry):
+		rect = Rect.from_geometry(event.geometry)
+		self.wm.get_monitor(event.monitor_id).data["rectangle"] = rect.to_dict()
+
+	def _desktop_add(self, event: events.DesktopAdd):
+		if self._fetch_desktop(event.desktop_id):
+			return
+		data = self.tree(Query.desktops().desktop(event.desktop_id))
+		if data is None:
+			return False
+		self.wm.get_monitor(event.monitor_id).add_desktop(Desktop(data, None))
+
+	def _desktop_rename(self, event: events.DesktopRename):
+		desktop = self.wm.get_desktop(event.desktop_id)
+		names = event.names
+		old_name = desktop.name
+		if names.endswith(f" {old_name}"):
+			# Already renamed locally by the command that caused this event
+			return
+		if not names.startswith(f"{old_name} "):
+			return self._fetch_desktop(event.desktop_id)
+		desktop.name = names[len(old_name) + 1:]
+
+	def _desktop_remove(self, event: events.DesktopRemove):
+		desktop = self.wm.get_desktop(event.desktop_id)
+		if desktop is not None:
+			desktop.monitor.remove_desktop(desktop)
+
+	def _desktop_swap(self, event: events.DesktopSwap):
+		src_monitor, dst_monitor = self.wm.get_monitor(event.src_monitor_id), self.wm.get_monitor(event.dst_monitor_id)
+		src, dst = src_monitor.get_desktop(event.src_desktop_id), dst_monitor.get_desktop(event.dst_desktop_id)
+		if src is None or dst is None:
+			return False
+		src_index, dst_index = src_monitor.desktops.index(src), dst_monitor.desktops.index(dst)
+		if src_monitor is dst_monitor:
+			src_monitor.desktops[src_index], src_monitor.desktops[dst_index] = dst, src
+		else:
+			src_monitor.replace_desktop(src_index, dst)
+			dst_monitor.replace_desktop(dst_index, src)
+
+	def _desktop_transfer(self, event: events.DesktopTransfer):
+		src_monitor, dst_monitor = self.wm.get_monitor(event.src_monitor_id), self.wm.get_monitor(event.dst_monitor_id)
+		desktop = src_monitor.get_desktop(event.desktop_id)
+		if desktop is None:
+			return False
+		src_monitor.remove_desktop(desktop)
+		dst_monitor.add_desktop(desktop)
+
+	def _desktop_focus(self, event: events.DesktopFocus):
+		self._focus(event.monitor_id, event.desktop_id)
+
+	def _desktop_activate(self, event: events.DesktopActivate):
+		self.wm.get_monitor(event.monitor_id).data["focusedDesktopId"] = event.desktop_id
+
+	def _desktop_layout(self, event: events.DesktopLayout):
+		self.wm.get_desktop(event.desktop_id).data["layout"] = event.layout
+
+	def _node_add(self, event: events.NodeAdd):
+		return self._fetch_desktop(event.desktop_id)
+
+	def _node_remove(self, event: events.NodeRemove):
+		return self._fetch_desktop(event.desktop_id)
+
+	def _node_swap(self, event: events.NodeSwap):
+		return self._fetch_desktop(event.src_desktop_id) and self._fetch_desktop(event.dst_desktop_id)
+
+	_node_transfer = _node_swap
+
+	def _node_focus(self, event: events.NodeFocus):
+		self._focus(event.monitor_id, event.desktop_id, event.node_id)
+
+	def _node_activate(self, event: events.NodeActivate):
+		self.wm.get_desktop(event.desktop_id).data["focusedNodeId"] = event.node_id
+
+	def _node_state(self, event: events.NodeState):
+		return self._fetch_desktop(event.desktop_id)
+
+	def _node_flag(self, event: events.NodeFlagChange):
+		return self._fetch_desktop(event.desktop_id)
+
+	def _node_geometry(self, event: events.NodeGeometry):
+		node = self.wm.get_node(event.node_id)
+		if node is None:
+			return False
+		rect = Rect.from_geometry(event.geometry).to_dict()
+		node.data["rectangle"] = rect
+		if node.client is not None:
+			key = "floatingRectangle" if node.client.state is ClientState.FLOATING else "tiledRectangle"
+			node.client.data[key] = rect
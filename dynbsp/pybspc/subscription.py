@@ -1,87 +1,151 @@
-import traceback
-from logging import debug, info, warning
+from logging import debug, warning
+from select import select
+from time import monotonic, perf_counter
+from typing import Callable, Dict, FrozenSet, Tuple
 
-from .bspwm import BSPWM
-from .utils import run
+from .connection import CONNECTION
+from .events import Event
+from .metrics import Metrics
+from .profiler import HandlerProfiler
+from .state import State
+from .utils import execute
 
 
 class Subscriber:
-	def __init__(self):
-		self.subscription = run('bspc subscribe all', wait=False)
-		self.events = {}
+	def __init__(self, debounce: float = 0.0, max_delay: float = 1.0):
+		"""
+		:param debounce: how long to wait for further events before running deferred passes
+		:param max_delay: the longest a burst of events can hold back the deferred passes
+		"""
+		self.subscription = None
+		self.state = None
+		self.topics: FrozenSet[str] = frozenset()
+		self.events: Dict[str, Callable] = {}
+		self.debounce = debounce
+		self.max_delay = max_delay
+		self.deferred: Dict[Tuple[Callable, tuple], None] = {}
+		self.readers: Dict[object, Callable] = {}
+		self.metrics = Metrics()
+		self.profiler = HandlerProfiler()
+
+	def subscribe(self):
+		"""
+		(Re)subscribe to the events that have handlers, plus the ones the state mirror needs
+		"""
+		self.topics = State.EVENTS.union(self.events)
+		previous = self.subscription
+		self.subscription = execute(["bspc", "subscribe", *sorted(self.topics)], wait=False)
+		if self.state is None:
+			self.state = State(self.subscription)
+		else:
+			self.state.resubscribe(self.subscription)
+		if previous is not None:
+			previous.close()
 
 	def poll(self):
+		if self.state is None:
+			self.subscribe()
 		try:
-			return self.subscription.readline()
+			return self.state.poll()
 		except KeyboardInterrupt:
 			exit()
-		except UnicodeDecodeError:
-			return ""
+
+	def add_reader(self, reader, callback: Callable):
+		"""
+		Call `callback()` from the event loop whenever `reader` (anything with a `fileno`) becomes readable
+		"""
+		self.readers[reader] = callback
+
+	def wait(self, timeout=None) -> bool:
+		"""
+		Wait up to `timeout` seconds for bspwm events or any other reader, returning whether events were read
+		"""
+		ready = select([self.state, *self.readers], [], [], timeout)[0]
+		for reader in ready:
+			if reader is not self.state:
+				try:
+					self.readers[reader]()
+				except Exception:
+					warning(f"Exception caught while handling {reader}", exc_info=True)
+		return self.state in ready and self.state.read(timeout=0)
 
 	def listen(self):
+		if self.state is None:
+			self.subscribe()
+		self.state.activate()
 		while True:
-			message = self.poll()
-			if message.split(' ')[0] in self.events.keys():
-				self.handle(message)
-			else:
-				continue
-				debug(f"Unhandled message: {message}")
+			try:
+				if self.wait():
+					self.drain()
+			except EOFError:
+				warning("bspwm subscription closed")
+				return
+			except KeyboardInterrupt:
+				exit()
+			self.run_deferred()
 
-	def handle(self, message):
-		try:
-			message = message.split(' ')
-			action = message[0]
-			info(f"Handling action: {action}")
-			wm = BSPWM.get()
-			if action == 'node_add':
-				# monitor_id    desktop_id  ip_id   node_id
-				monitor = wm.get_monitor(message[1])
-				desktop = wm.get_desktop(message[2])
-				node = wm.get_node(message[4])
-				self.events.get(action)(wm, monitor, desktop, node)
-			if action == 'node_remove':
-				# monitor_id    desktop_id   node_id
-				monitor = wm.get_monitor(message[1])
-				desktop = wm.get_desktop(message[2])
-				node = wm.get_node(message[3])
-				self.events.get(action)(wm, monitor, desktop, node)
-			if action == 'desktop_transfer':
-				# src_monitor_id src_desktop_id dst_monitor_id
-				src_monitor = wm.get_monitor(message[1])
-				src_desktop = wm.get_desktop(message[2])
-				dst_monitor = wm.get_monitor(message[3])
-				self.events.get(action)(wm, src_monitor, src_desktop, dst_monitor)
-			if action == 'desktop_remove':
-				# <monitor_id> <desktop_id>
-				monitor = wm.get_monitor(message[1])
-				desktop = wm.get_desktop(message[2])
-				self.events.get(action)(wm, monitor, desktop)
-			if action == 'node_transfer':
-				# <src_monitor_id> <src_desktop_id> <src_node_id>
-				# <dst_monitor_id> <dst_desktop_id> <dst_node_id>
-				src_monitor = wm.get_monitor(message[1])
-				src_desktop = wm.get_desktop(message[2])
-				src_node = wm.get_node(message[3])
-				dst_monitor = wm.get_monitor(message[4])
-				dst_desktop = wm.get_desktop(message[5])
-				dst_node = wm.get_node(message[6])
-				self.events.get(action)(wm, src_monitor, src_desktop, src_node, dst_monitor, dst_desktop, dst_node)
-			if action == 'monitor_remove':
-				# <monitor_name>
-				pass
-			if action == 'monitor_add':
-				# <monitor_id> <monitor_name> <monitor_geometry>
-				monitor = wm.get_monitor(message[1])
-				self.events.get(action)(wm, monitor)
+	def drain(self):
+		"""
+		Handle the rest of the current burst: everything already sent, plus anything arriving within `debounce`
+		"""
+		deadline = monotonic() + self.max_delay
+		while True:
+			self.metrics.observe_lag(len(self.state.pending), self.state.unread())
+			while self.state.pending:
+				self.dispatch(self.state.pending.popleft())
+			timeout = max(0.0, min(self.debounce, deadline - monotonic()))
+			if not self.wait(timeout):
+				return
 
-		except Exception as e:
-			warning("Exception caught while handling '" + " ".join(message) + "'")
-			traceback.print_exc()
-			print("MESSAGE:", message)
+	def dispatch(self, event: Event):
+		handler = self.events.get(event.NAME)
+		if handler is not None:
+			self.handle(event, handler)
+
+	def defer(self, callback: Callable, *args):
+		"""
+		Run `callback(*args)` once the current burst of events has been handled.
+		Deferring the same call several times during a burst only runs it once
+		"""
+		self.deferred[(callback, args)] = None
+
+	def run_deferred(self):
+		while self.deferred:
+			pending, self.deferred = self.deferred, {}
+			for callback, args in pending:
+				sent = CONNECTION.snapshot()
+				start = perf_counter()
+				try:
+					debug("Running deferred %s", callback.__name__)
+					with self.profiler.profile(callback.__name__):
+						callback(*args)
+				except Exception:
+					warning(f"Exception caught while running deferred {callback.__name__}", exc_info=True)
+				self.metrics.observe_handler(callback.__name__, perf_counter() - start, CONNECTION.since(sent))
+
+	def handle(self, event: Event, handler: Callable):
+		debug("Handling action: %s", event.NAME)
+		sent = CONNECTION.snapshot()
+		start = perf_counter()
+		try:
+			arguments = event.arguments(self.state.sync())
+			called, called_sent = perf_counter(), CONNECTION.snapshot()
+			with self.profiler.profile(handler.__name__):
+				handler(*arguments)
+		except Exception:
+			called = None
+			warning(f"Exception caught while handling {event}", exc_info=True)
+		end = perf_counter()
+		# The event also pays for bringing the mirror up to date before its handler runs
+		self.metrics.observe_event(event.NAME, end - start, CONNECTION.since(sent))
+		if called is not None:
+			self.metrics.observe_handler(handler.__name__, end - called, CONNECTION.since(called_sent))
 
 	def event(self, event_str):
 		def decorator(f):
 			self.events[event_str] = f
+			if self.subscription is not None and event_str not in self.topics:
+				self.subscribe()
 			return f
 
 		return decorator
@@ -1,14 +1,19 @@
 from dataclasses import dataclass
 from json import loads
 from logging import error
+from re import compile
 from subprocess import Popen, PIPE
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-INVCHAR = "\u200B"
+from .connection import CONNECTION, Reply
+
+GEOMETRY_PATTERN = compile(r"^(\d+)x(\d+)\+?([+-]?\d+)\+?([+-]?\d+)$")
 
 
 class Process:
 	def __init__(self, process: Popen):
 		self.process = process
+		self._error: Optional[str] = None
 
 	def read(self):
 		return self.process.stdout.read().strip().decode('utf-8')
@@ -19,47 +24,240 @@ class Process:
 	def readline(self):
 		return self.process.stdout.readline().strip().decode('utf-8')
 
+	def fileno(self):
+		return self.process.stdout.fileno()
+
+	@property
+	def failed(self):
+		return self.process.wait() != 0
+
 	def wait(self, timeout=None):
 		self.process.wait(timeout)
-		err = self.error()
-		if err:
-			error(err)
+		if self.failed:
+			error(self.error() or f"bspc exited with status {self.process.returncode}")
 
-	def error(self):
-		if self.process.stderr is None:
+	def error(self) -> Optional[str]:
+		if not self.failed:
 			return None
-		return self.process.stderr.read().strip().decode('utf-8')
+		if self.process.stderr is None:
+			return ""
+		if self._error is None:
+			# Every operation of a merged command asks for the same error
+			self._error = self.process.stderr.read().strip().decode('utf-8')
+		return self._error
+
+	def close(self):
+		self.process.terminate()
+		self.process.stdout.close()
+		self.process.wait()
 
 
 def run(*args, wait=True, debug=False):
+	"""
+	Run a command line given as a string, split on spaces, with `\\S` standing for a space inside an argument.
+	pybspc itself builds argument lists (see `execute` and `command`), so names never need escaping
+	"""
 	command = []
 	for arg in args:
 		command.extend(arg.split(" "))
 	command = list(map(lambda c: c.replace('\S', ' '), command))
 	if debug:
 		print("Running:", args, "->", list(command))
+	return execute(command, wait=wait)
+
+
+def execute(command: List[str], wait=True):
+	if Transaction.current is not None:
+		Transaction.current.flush()
+	if command[0] == "bspc":
+		reply = CONNECTION.send(command[1:])
+		if reply is not None:
+			if wait: reply.wait()
+			return reply
+		CONNECTION.count(command[1:])
 	process = Process(Popen(command, stdout=PIPE))
 	if wait: process.wait()
 	return process
 
 
+def command(domain: str, selector, *args):
+	"""
+	Run `bspc <domain> <selector> <args...>`, or queue it if a `Transaction` is active
+	"""
+	if Transaction.current is not None:
+		return Transaction.current.add(domain, selector, *args)
+	return execute(["bspc", domain, str(selector), *map(str, args)])
+
+
+class Operation:
+	def __init__(self, domain: str, selector: str, args: List[str]):
+		self.domain = domain
+		self.selector = selector
+		self.args = args
+		self.reply: Union[Reply, Process, None] = None
+		# The operations sent in the same message, this one included
+		self.message: List[Operation] = [self]
+
+	@property
+	def merged(self):
+		return len(self.message) > 1
+
+	def command(self) -> List[str]:
+		"""
+		The message this operation was sent in
+		"""
+		first = self.message[0]
+		return [first.domain, first.selector, *(arg for operation in self.message for arg in operation.args)]
+
+	@property
+	def failed(self) -> bool:
+		return self.reply is not None and self.reply.failed
+
+	def error(self) -> Optional[str]:
+		if not self.failed:
+			return None
+		err = self.reply.error() or "failed without a message"
+		if self.merged:
+			# bspwm stops at the first argument it can't apply, and only says which in its own words
+			return f"{err} (in the merged command: bspc {' '.join(self.command())})"
+		return err
+
+	def __repr__(self):
+		return f"<Operation bspc {self.domain} {self.selector} {' '.join(self.args)}>"
+
+
+class Transaction:
+	"""
+	Collects bspc commands and sends them together.
+
+	Consecutive operations on the same node or desktop are merged into a single command
+	(e.g. `bspc node <id> --state floating --flag sticky=on --move 10 10`), and the resulting
+	commands are pipelined over the socket, so a handler costs one round trip instead of one per call.
+	A merged command never grows past what bspwm reads in one message.
+
+		with Transaction() as transaction:
+			node.set_state(ClientState.FLOATING)
+			node.set_flag(NodeFlag.STICKY)
+		transaction.errors()
+
+	bspwm replies once per message, so when a merged command fails each of its operations reports that
+	failure along with the command it was part of. Pass `merge=False` when every operation needs a reply of
+	its own: they are still pipelined, just sent as separate messages.
+	"""
+
+	MERGEABLE = {"node", "desktop"}
+	current: Optional["Transaction"] = None
+
+	def __init__(self, merge: bool = True):
+		self.merge = merge
+		self.operations: List[Operation] = []
+		self.pending: List[Operation] = []
+		self.parent: Optional[Transaction] = None
+
+	def __enter__(self):
+		if Transaction.current is not None:
+			Transaction.current.flush()
+		self.parent, Transaction.current = Transaction.current, self
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		Transaction.current = self.parent
+		self.flush()
+
+	def add(self, domain: str, selector, *args) -> Operation:
+		operation = Operation(domain, str(selector), list(map(str, args)))
+		self.operations.append(operation)
+		self.pending.append(operation)
+		return operation
+
+	def _messages(self) -> List[List[Operation]]:
+		messages: List[List[Operation]] = []
+		size = 0
+		for operation in self.pending:
+			if self.merge and messages:
+				previous = messages[-1][-1]
+				grown = size + CONNECTION.size(operation.args)
+				if operation.domain in self.MERGEABLE and (operation.domain, operation.selector) == (
+						previous.domain, previous.selector) and grown <= CONNECTION.MESSAGE_SIZE:
+					messages[-1].append(operation)
+					operation.message = messages[-1]
+					size = grown
+					continue
+			messages.append(operation.message)
+			size = CONNECTION.size(operation.command())
+		return messages
+
+	def flush(self):
+		"""
+		Send every queued operation
+		"""
+		messages = self._messages()
+		self.pending = []
+		if not messages:
+			return
+		commands = [operations[0].command() for operations in messages]
+		replies = CONNECTION.send_many(commands)
+		for args, operations, reply in zip(commands, messages, replies):
+			if reply is None:
+				CONNECTION.count(args)
+				reply = Process(Popen(["bspc", *args], stdout=PIPE, stderr=PIPE))
+			reply.wait()
+			for operation in operations:
+				operation.reply = reply
+
+	def errors(self) -> List[Tuple[Operation, str]]:
+		"""
+		Every operation that failed, with its error. A failed merged command is reported against each of its
+		operations, as bspwm doesn't say which one it stopped at
+		"""
+		return [(operation, operation.error()) for operation in self.operations if operation.failed]
+
+
 def _int(i):
 	if type(i) == str:
 		return int(i, 0)
 	return int(i)
 
 
-@dataclass
+def cached(cache: Dict[str, tuple], data: dict, key: str, factory: Callable):
+	"""
+	Build `factory(data[key])` once per value of `data[key]`. Updates replace that value rather than
+	mutating it, so a different object means the cached result is stale
+	"""
+	source = data[key]
+	entry = cache.get(key)
+	if entry is None or entry[0] is not source:
+		entry = cache[key] = (source, factory(source))
+	return entry[1]
+
+
+@dataclass(frozen=True)
 class Rect:
 	x: int
 	y: int
 	width: int
 	height: int
 
+	@staticmethod
+	def from_geometry(geometry: str):
+		width, height, x, y = GEOMETRY_PATTERN.match(geometry).groups()
+		return Rect(int(x), int(y), int(width), int(height))
 
-@dataclass
+	@staticmethod
+	def from_dict(data):
+		return Rect(data["x"], data["y"], data["width"], data["height"])
+
+	def to_dict(self):
+		return {"x": self.x, "y": self.y, "width": self.width, "height": self.height}
+
+
+@dataclass(frozen=True)
 class Padding:
 	top: int
 	right: int
 	bottom: int
 	left: int
+
+	@staticmethod
+	def from_dict(data):
+		return Padding(data["top"], data["right"], data["bottom"], data["left"])
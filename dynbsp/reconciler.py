@@ -0,0 +1,122 @@
+"""
+Bringing the desktops in line with the config in one pass.
+
+A `Reconciliation` is planned from a single snapshot of the tree: every monitor gets a home desktop, empty
+desktops other than homes are removed (only from the monitors a window has just left, when those are given, so
+a desktop made with `new-desktop` isn't swept away by a window opening elsewhere), each desktop holding a configured application is named after that
+desktop's config (expanded while another desktop of the same name is live), and each monitor is ordered home
+first, then configured desktops by `order`, then the rest as they were. Only the differences become commands.
+
+Clients aren't moved: which configured desktop a desktop is follows from the clients on it, as it always has.
+New clients are placed by the `node_add` handler as they appear.
+"""
+from typing import Collection, Dict, List, Optional, Tuple
+
+from .config import CONFIG, DesktopConfig
+from .pybspc import BSPWM, Desktop, Monitor, Transaction, get_wm
+
+
+class Reconciliation:
+	def __init__(self, wm: BSPWM):
+		self.wm = wm
+		# Monitors without a home desktop
+		self.homes: List[Monitor] = []
+		self.removals: List[Desktop] = []
+		self.renames: Dict[Desktop, str] = {}
+		self.configs: Dict[Desktop, DesktopConfig] = {}
+
+	@staticmethod
+	def plan(wm: BSPWM, emptied: Collection[int] = None) -> "Reconciliation":
+		"""
+		`emptied` holds the ids of the monitors to remove empty desktops from; every monitor's when None
+		"""
+		reconciliation = Reconciliation(wm)
+		for monitor in wm.monitors:
+			home = CONFIG.get_home(monitor)
+			if home is None:
+				reconciliation.homes.append(monitor)
+			for desktop in monitor.desktops:
+				if desktop.root is None and not CONFIG.match_home(desktop) and (
+						emptied is None or monitor.id in emptied):
+					reconciliation.removals.append(desktop)
+		reconciliation.configs = CONFIG.live_configs(wm)
+		live = set(reconciliation.configs.values())
+		for desktop, desk in reconciliation.configs.items():
+			name = desk.live_name(live)
+			if desktop.name != name:
+				reconciliation.renames[desktop] = name
+		return reconciliation
+
+	def order(self, monitor: Monitor) -> List[Desktop]:
+		"""
+		Where `monitor`'s desktops should be, leaving out the ones being removed
+		"""
+		desktops = [desktop for desktop in monitor.desktops if desktop not in self.removals]
+		home = CONFIG.get_home(monitor)
+		configured = sorted((desktop for desktop in desktops if desktop in self.configs),
+							key=lambda desktop: (self.configs[desktop].order, self.configs[desktop].index))
+		ordered = ([home] if home is not None else []) + configured
+		return ordered + [desktop for desktop in desktops if desktop not in ordered]
+
+	def orders(self) -> List[Tuple[Monitor, List[Desktop]]]:
+		"""
+		The monitors whose desktops are out of order, with the order they should be in
+		"""
+		orders = []
+		for monitor in self.wm.monitors:
+			ordered = self.order(monitor)
+			if [desktop for desktop in monitor.desktops if desktop not in self.removals] != ordered:
+				orders.append((monitor, ordered))
+		return orders
+
+	def __bool__(self):
+		return bool(self.homes or self.removals or self.renames or self.orders())
+
+	def describe(self) -> List[str]:
+		lines = [f"create a home desktop on {monitor}" for monitor in self.homes]
+		lines += [f"remove {desktop}" for desktop in self.removals]
+		lines += [f"rename {desktop} to {name!r}" for desktop, name in self.renames.items()]
+		unordered = {monitor for monitor, _ in self.orders()}
+		for monitor in self.wm.monitors:
+			ordered: List[Optional[Desktop]] = self.order(monitor)
+			if monitor in self.homes:
+				ordered.insert(0, None)
+			elif monitor not in unordered:
+				continue
+			names = ", ".join("(new home)" if desktop is None else repr(self.renames.get(desktop, desktop.name))
+							  for desktop in ordered)
+			lines.append(f"order {monitor}: {names}")
+		return lines
+
+	def apply(self):
+		for monitor in self.homes:
+			home = monitor.create_desktop(CONFIG.home_desktop.name)
+			if monitor.get_desktop(home.id) is None:
+				monitor.add_desktop(home)
+		with Transaction():
+			deletions = [(desktop, desktop.delete()) for desktop in self.removals]
+			for desktop, name in self.renames.items():
+				desktop.rename(name)
+		# A desktop bspwm wouldn't remove is still there, and is ordered along with the rest
+		for desktop in (desktop for desktop, operation in deletions if not operation.failed):
+			# A running instance's mirror skips the removal events for desktops it no longer has
+			if desktop.monitor is not None and desktop.monitor.get_desktop(desktop.id) is desktop:
+				desktop.monitor.remove_desktop(desktop)
+		self.removals = []
+		for monitor, ordered in self.orders():
+			monitor.reorder(ordered)
+
+
+def reconcile(wm: BSPWM = None, dry_run=False, emptied: Collection[int] = None) -> Optional[List[str]]:
+	"""
+	Make the desktops match the config, removing empty desktops from the `emptied` monitors only if given
+	(see `Reconciliation.plan`). With `dry_run`, only return what would be done
+	"""
+	if wm is None:
+		wm = get_wm()
+	reconciliation = Reconciliation.plan(wm, emptied)
+	if dry_run:
+		return reconciliation.describe()
+	if reconciliation:
+		reconciliation.apply()
+	return None
@@ -0,0 +1,87 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+from logging import debug
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher:
+	"""
+	Notices when a file changes, as something that can be passed to `select`.
+
+	Uses inotify on the file's directory (so editors that save by renaming over the file are caught),
+	and falls back to a thread polling the file's mtime and size when inotify isn't available.
+	"""
+
+	def __init__(self, path: str, interval: float = 1.0):
+		self.path = os.path.realpath(path)
+		self.directory, self.name = os.path.split(self.path)
+		self.interval = interval
+		self._fd = self._inotify()
+		if self._fd is None:
+			debug(f"inotify isn't available, polling {self.path} every {interval}s")
+			self._fd, self._notify = os.pipe()
+			threading.Thread(target=self._poll, name="config-watcher", daemon=True).start()
+
+	def _inotify(self):
+		try:
+			libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+			fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		except (OSError, AttributeError):
+			return None
+		if fd < 0:
+			return None
+		mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+		if libc.inotify_add_watch(fd, self.directory.encode(), mask) < 0:
+			os.close(fd)
+			return None
+		self._notify = None
+		return fd
+
+	def _stat(self):
+		try:
+			stat = os.stat(self.path)
+		except OSError:
+			return None
+		return stat.st_mtime_ns, stat.st_size
+
+	def _poll(self):
+		last = self._stat()
+		event = threading.Event()
+		while not event.wait(self.interval):
+			current = self._stat()
+			if current != last:
+				last = current
+				os.write(self._notify, b"\0")
+
+	def fileno(self):
+		return self._fd
+
+	def read(self) -> bool:
+		"""
+		Consume pending notifications, returning whether any of them were about the watched file
+		"""
+		try:
+			data = os.read(self._fd, 4096)
+		except BlockingIOError:
+			return False
+		if self._notify is not None:
+			return True
+		changed = False
+		offset = 0
+		while offset < len(data):
+			_, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+			offset += EVENT_HEADER.size
+			name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+			offset += length
+			changed = changed or name == self.name
+		return changed
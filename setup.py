@@ -20,7 +20,7 @@ setup(
 	setup_requires=['setuptools-git-versioning'],
 	entry_points='''
         [console_scripts]
-        dynbsp=dynbsp.__main__:cli
+        dynbsp=dynbsp.__main__:main
     ''',
 	python_requires='>=3.8',
 )